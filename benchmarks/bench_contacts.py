@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of contacts.extract_contacts against the anchored phone/email regexes formerly run by
+Restaurant.regex_scrape, on large generated restaurant pages and on inputs built to make regexes backtrack.
+
+    python benchmarks/bench_contacts.py [megabytes]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import contacts  # noqa: E402
+from parser_fixtures import _padding  # noqa: E402
+
+OLD_PHONE = re.compile(
+    '^(?:(?:\\(?(?:00|\\+)([1-4]\\d\\d|[1-9]\\d?)\\)?)?[\\-\\.\\ \\\\\\/]?)?((?:\\(?\\d{1,}\\)?[\\-\\.\\ \\\\\\/]?){0,})(?:[\\-\\.\\ \\\\\\/]?(?:#|ext\\.?|extension|x)[\\-\\.\\ \\\\\\/]?(\\d+))?$')
+OLD_EMAIL = re.compile(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)")
+
+
+def restaurant_page(megabytes, seed=0):
+    rng = random.Random(seed)
+    blocks = []
+    size = 0
+    while size < megabytes * 1048576:
+        block = _padding(rng, 60000)
+        block += ('<footer><p>Call us at ({0}) {1}-{2:04d} or <a href="tel:+1{0}{1}{2:04d}">tap to call</a>.</p>'
+                  '<p>Catering: <a href="mailto:catering{3}@joesdiner.com">catering{3}@joesdiner.com</a>, '
+                  'press{3}&#64;joesdiner.com</p><img src="/img/logo@2x.png"></footer>').format(
+            rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999), rng.randint(0, 20))
+        blocks.append(block)
+        size += len(block)
+    return ''.join(blocks)
+
+
+def old_scrape(page):
+    return OLD_PHONE.findall(page), OLD_EMAIL.findall(page)
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    inputs = [
+        ('restaurant page', restaurant_page(megabytes)),
+        ('digit runs', '1 2 3 4 5 6 7 8 9 ' * int(megabytes * 58000)),
+        ('word run, no @', 'a' * int(megabytes * 1048576)),
+        ('dense @', 'ab@' * int(megabytes * 350000)),
+    ]
+    for label, page in inputs:
+        mb = len(page) / 1048576.0
+        print('{0} ({1:.1f} MB)'.format(label, mb))
+        for name, fn in (('old anchored regexes', old_scrape), ('extract_contacts', contacts.extract_contacts)):
+            start = time.perf_counter()
+            phones, emails = fn(page)
+            elapsed = time.perf_counter() - start
+            print('  {0:<22}: {1:7.3f} s {2:8.1f} MB/s  {3} phones, {4} emails'.format(
+                name, elapsed, mb / elapsed, len(phones), len(emails)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the custom-menu extraction formerly in Restaurant.scrape_custom_menu, which walked every tag
+and re-parsed each menu-item with a new BeautifulSoup, against menu_parsers.parse_custom_menu on a large
+restaurant-builder site (benchmarks/fixtures/custom/custom_site_large.html).
+
+    python benchmarks/bench_custom_menu.py [repeat]
+"""
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import menu_parsers  # noqa: E402
+from parser_fixtures import FIXTURE_DIR, ensure_fixtures  # noqa: E402
+
+
+def old_extractor(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    potential_menu_items = []
+    for tag in soup.find_all():
+        try:
+            if 'menu-item' in tag.get('class'):
+                potential_menu_items.append(tag)
+        except TypeError:  # no class attribute available for tag
+            pass
+    dishes = []
+    for menu_item in potential_menu_items:
+        menu_item = str(menu_item).replace('&amp;dollar;', '$')
+        menu_item = BeautifulSoup(menu_item, 'html.parser').text
+        try:
+            price = re.search(r'(\$?\d+)', menu_item).group(1)
+        except AttributeError:
+            price = 'N/A'
+        name = menu_item.replace(price, '')
+        lines = [i.strip().encode('utf-8') for i in name.splitlines() if len(i.strip()) > 0]
+        if lines:
+            dishes.append({'dish_name': lines[0], 'dish_price': price})
+    return dishes
+
+
+def new_extractor(backend):
+    def extract(content):
+        menu_parsers.configure(backend=backend, partial=True)
+        return menu_parsers.parse_custom_menu(content)
+    return extract
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    ensure_fixtures()
+    with open(os.path.join(FIXTURE_DIR, 'custom', 'custom_site_large.html'), 'rb') as f:
+        content = f.read()
+    print('custom_site_large.html: {0:,} bytes'.format(len(content)))
+    for label, fn in (('old find_all + re-parse', old_extractor),
+                      ('parse_custom_menu html.parser', new_extractor('html.parser')),
+                      ('parse_custom_menu lxml', new_extractor('lxml'))):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dishes = fn(content)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        dollars = sum(1 for d in dishes if d['dish_price'].startswith('$'))
+        print('{0:<30}: {1:8.3f} s  {2} items, {3} priced in dollars'.format(label, best, len(dishes), dollars))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput comparison of the blocking requests path against the asyncio Fetcher.
+
+Serves a fake menu page from a local server with an artificial per-request latency, so the
+numbers reflect time spent waiting on sockets rather than on the real menu sites.
+
+    python benchmarks/bench_fetch.py [pages] [latency_ms]
+"""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fetch import Fetcher  # noqa: E402
+
+PAGE = ('<html><body><div class="items">' +
+        '<div class="item"><h4 class="item-title">Cheeseburger</h4><span class="price">$9</span></div>' * 200 +
+        '</div></body></html>').encode('utf-8')
+
+
+def make_handler(latency):
+    class MenuHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+        def log_message(self, *args):
+            pass
+    return MenuHandler
+
+
+class MenuServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def start_server(latency):
+    server = MenuServer(('127.0.0.1', 0), make_handler(latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_session_per_call(urls):
+    start = time.perf_counter()
+    for url in urls:
+        with requests.Session() as session:
+            session.get(url).content
+    return time.perf_counter() - start
+
+
+def bench_blocking(urls):
+    start = time.perf_counter()
+    with requests.Session() as session:
+        for url in urls:
+            session.get(url).content
+    return time.perf_counter() - start
+
+
+def bench_fetcher(urls, concurrency):
+    with Fetcher(concurrency=concurrency, per_host=concurrency) as fetcher:
+        start = time.perf_counter()
+        responses = fetcher.get_many(urls)
+        elapsed = time.perf_counter() - start
+    failures = [r for r in responses if isinstance(r, Exception)]
+    if failures:
+        raise failures[0]
+    return elapsed
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000.0
+    server = start_server(latency)
+    try:
+        urls = ['http://127.0.0.1:{0}/menu/{1}'.format(server.server_port, i) for i in range(pages)]
+        print('{0} pages, {1:.0f} ms simulated latency'.format(pages, latency * 1000))
+        per_call = bench_session_per_call(urls)
+        print('Session per call          : {0:7.2f} s  {1:8.1f} pages/s'.format(per_call, pages / per_call))
+        blocking = bench_blocking(urls)
+        print('blocking requests.Session : {0:7.2f} s  {1:8.1f} pages/s'.format(blocking, pages / blocking))
+        for concurrency in (10, 50, 100):
+            elapsed = bench_fetcher(urls, concurrency)
+            print('Fetcher concurrency={0:<4}: {1:7.2f} s  {2:8.1f} pages/s  ({3:.1f}x)'.format(
+                concurrency, elapsed, pages / elapsed, blocking / elapsed))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
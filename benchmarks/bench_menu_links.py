@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the old menu link discovery in get_menu_link_from_google (full download, BeautifulSoup tree,
+str(soup), re.findall) with MenuLinkScanner fed from Fetcher.astream, on a multi-megabyte Maps-like page
+served locally at a throttled transfer rate. The menu link sits a third of the way into the page.
+
+    python benchmarks/bench_menu_links.py [megabytes] [megabytes_per_second]
+"""
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import menu_parsers  # noqa: E402
+from fetch import Fetcher  # noqa: E402
+
+MENU_LINK = 'http://places.singleplatform.com/joes-diner/menu?ref=google'
+
+
+def maps_page(megabytes):
+    filler = ('<div class="section-result"><a href="http://www.google.com/maps/place/{0}">Nearby {0}</a>'
+              '<script>window.APP_INITIALIZATION_STATE.push(["http:\\/\\/maps.gstatic.com\\/tiles\\/{0}.png"]);'
+              '</script></div>')
+    blocks = [filler.format(i) for i in range(int(megabytes * 1048576 / len(filler.format(0))))]
+    blocks.insert(len(blocks) // 3, '<a href="{0}">Menu</a>'.format(MENU_LINK))
+    return ('<html><body>' + ''.join(blocks) + '</body></html>').encode('utf-8')
+
+
+def make_handler(page, rate):
+    class MapsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            step = 65536
+            try:
+                for start in range(0, len(page), step):
+                    self.wfile.write(page[start:start + step])
+                    time.sleep(step / rate)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+    return MapsHandler
+
+
+def old_discovery(fetcher, url):
+    r = fetcher.get(url)
+    soup = BeautifulSoup(r.content, 'html.parser')
+    potential_menu_links = [i for i in re.findall('(http:.*?)"', str(soup)) if 'google.com' not in i]
+    for link in potential_menu_links:
+        if 'urbanspoon' in link or 'singleplatform' in link:
+            return link, len(r.content)
+
+
+def streamed_discovery(fetcher, url):
+    scanner = menu_parsers.MenuLinkScanner()
+    r = fetcher.run(fetcher.astream(url, scanner.feed))
+    if r.complete:
+        scanner.close()
+    return scanner.found and scanner.found[0], len(r.content)
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 8
+    page = maps_page(megabytes)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(page, rate * 1048576))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{0}/maps/place/joes-diner'.format(server.server_address[1])
+    print('{0:.1f} MB page at {1} MB/s'.format(len(page) / 1048576.0, rate))
+    with Fetcher() as fetcher:
+        for label, fn in (('download + soup + findall', old_discovery), ('streamed scanner', streamed_discovery)):
+            start = time.perf_counter()
+            link, read = fn(fetcher, url)
+            elapsed = time.perf_counter() - start
+            print('{0:<26}: {1:7.3f} s  {2:5.1f} MB read  {3}'.format(label, elapsed, read / 1048576.0, link))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Bytes per menu item held in memory: the old __dict__ MenuItem with raw scraper values, the slotted
+MenuItem and a columnar MenuTable, for a synthetic city-sized crawl where dish names repeat across
+restaurants the way chains and common dishes do.
+
+    python benchmarks/bench_menu_memory.py [items]
+"""
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from menu import MenuItem, MenuTable  # noqa: E402
+from parser_fixtures import WORDS  # noqa: E402
+
+
+class DictMenuItem:
+    def __init__(self, dish_name, dish_size, dish_price, dish_cals, dish_items, image=None, fetcher=None):
+        self.dish_name = dish_name
+        self.dish_size = dish_size
+        self.dish_price = dish_price
+        self.dish_cals = dish_cals
+        self.dish_items = dish_items
+        self.image = image
+        self.fetcher = fetcher
+
+
+def scraped_rows(count, seed=0):
+    """
+    Yields MenuItem keyword dicts shaped like the different scrapers' output, built fresh each time
+    the way parsed pages produce them, so equal names are distinct objects until interned.
+    """
+    rng = random.Random(seed)
+    names = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title() for _ in range(count // 20 or 1)]
+    for i in range(count):
+        name = ''.join(rng.choice(names))
+        shape = i % 3
+        price = '${0}.{1:02d}'.format(rng.randint(3, 40), rng.choice([0, 50, 95]))
+        yield {
+            'dish_name': [name.encode('utf-8')] if shape == 0 else name.encode('utf-8') if shape == 1 else name,
+            'dish_size': None,
+            'dish_price': price.encode('utf-8') if shape == 1 else price,
+            'dish_cals': str(rng.randint(100, 1500)),
+            'dish_items': None if rng.random() < 0.5 else ' '.join(rng.choice(WORDS) for _ in range(8)),
+            'image': None if rng.random() < 0.8 else 'https://s3-media.example/{0}.jpg'.format(i),
+        }
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    held = build(scraped_rows(count))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    builds = (
+        ('dict MenuItem, raw values', lambda rows: [DictMenuItem(**row) for row in rows]),
+        ('slotted MenuItem', lambda rows: [MenuItem(**row) for row in rows]),
+        ('MenuTable', lambda rows: MenuTable(MenuItem(**row) for row in rows)),
+    )
+    print('{0:,} menu items'.format(count))
+    baseline = None
+    for label, build in builds:
+        size = measure(build, count)
+        baseline = baseline or size
+        print('{0:<26}: {1:8.1f} MB  {2:6.1f} bytes/item  {3:5.1f}x'.format(
+            label, size / 1048576.0, float(size) / count, float(baseline) / size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Offline micro-benchmark for the menu parsers. Every fixture under benchmarks/fixtures/<source>/ is run
+through that source's parser, no network involved, and pages/sec, items/sec and peak memory are reported.
+Missing generated fixtures are written first (see parser_fixtures.py); saved real pages can sit next to them.
+
+    python benchmarks/bench_parsers.py [--repeat N] [--save-baseline] [--tolerance 0.25] [--only SOURCE]
+                                       [--backend lxml|html.parser] [--full]
+
+Baselines live in benchmarks/parser_baselines.json. Without --save-baseline, each fixture is compared to
+its baseline and the run exits non-zero if any parser got slower than the tolerance allows.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import menu_parsers  # noqa: E402
+from parser_fixtures import ensure_fixtures  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_baselines.json')
+
+PARSERS = {
+    'urbanspoon': menu_parsers.parse_urbanspoon_menu,
+    'singleplatform': menu_parsers.parse_singleplatform_menu,
+    'custom': menu_parsers.parse_custom_menu,
+    'postmates': menu_parsers.parse_postmates_menu,
+    'allmenus': menu_parsers.parse_allmenus_menu,
+}
+
+
+def measure(parser, content, repeat):
+    """
+    :return: dict with the best per-page time, items per page and peak traced memory in bytes
+    """
+    items = len(parser(content))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    parser(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'items': items, 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per fixture, the best one counts')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a regression')
+    parser.add_argument('--only', choices=sorted(PARSERS), help='benchmark a single source')
+    parser.add_argument('--backend', choices=('lxml', 'html.parser'), default=menu_parsers.BACKEND)
+    parser.add_argument('--full', action='store_true', help='parse whole documents instead of plan subtrees')
+    args = parser.parse_args()
+    menu_parsers.configure(backend=args.backend, partial=not args.full)
+    print('backend {0}, {1} trees'.format(args.backend, 'full' if args.full else 'partial'))
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+
+    results = {}
+    regressions = []
+    print('{0:<40}{1:>10}{2:>10}{3:>12}{4:>12}{5:>11}  {6}'.format(
+        'fixture', 'KB', 'items', 'pages/s', 'items/s', 'peak MB', 'vs baseline'))
+    for source, paths in ensure_fixtures().items():
+        if source not in PARSERS or (args.only and source != args.only):
+            continue
+        for path in paths:
+            with open(path, 'rb') as f:
+                content = f.read()
+            name = '{0}/{1}'.format(source, os.path.basename(path))
+            result = measure(PARSERS[source], content, args.repeat)
+            results[name] = result
+            comparison = ''
+            baseline = baselines.get(name)
+            if baseline:
+                change = result['seconds'] / baseline['seconds'] - 1
+                comparison = '{0:+.0%}'.format(change)
+                if change > args.tolerance:
+                    comparison += '  REGRESSION'
+                    regressions.append(name)
+            print('{0:<40}{1:>10.0f}{2:>10}{3:>12.1f}{4:>12.0f}{5:>11.1f}  {6}'.format(
+                name, len(content) / 1024.0, result['items'], 1 / result['seconds'],
+                result['items'] / result['seconds'], result['peak_bytes'] / 1048576.0, comparison))
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('baseline saved to {0}'.format(BASELINE_PATH))
+    elif regressions:
+        print('{0} parser regression(s) over {1:.0%}: {2}'.format(len(regressions), args.tolerance,
+                                                                  ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
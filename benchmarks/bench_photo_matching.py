@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the all-pairs SequenceMatcher loop formerly used in gather_data_for_place against PhotoMatcher.
+
+    python benchmarks/bench_photo_matching.py [dishes] [captions]
+"""
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_matching import PhotoMatcher  # noqa: E402
+
+WORDS = ['chicken', 'beef', 'pork', 'shrimp', 'salmon', 'tofu', 'bacon', 'cheese', 'spicy', 'grilled', 'fried',
+         'smoked', 'caesar', 'garden', 'buffalo', 'bbq', 'teriyaki', 'sandwich', 'burger', 'salad', 'tacos',
+         'wings', 'pasta', 'pizza', 'soup', 'wrap', 'nachos', 'fries', 'quesadilla', 'platter', 'sliders',
+         'with', 'avocado', 'mushroom', 'onion', 'rings', 'pretzel', 'bites', 'egg', 'rolls', 'steak']
+
+
+def make_data(dishes, captions, seed=0):
+    rng = random.Random(seed)
+    names = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title() for _ in range(dishes)]
+    pictures = []
+    for i in range(captions):
+        if rng.random() < 0.5:
+            caption = rng.choice(names)
+            if rng.random() < 0.5:
+                caption = caption.lower() + ' ' + rng.choice(['yum', 'so good!', 'was amazing', ''])
+        else:
+            caption = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+        pictures.append((caption, 'https://s3-media.example/{0}.jpg'.format(i)))
+    return names, pictures
+
+
+def old_loop(names, pictures, threshold=0.6):
+    pictures = list(pictures)
+    images = []
+    for name in names:
+        image = None
+        for picture_tuples in pictures:
+            if SequenceMatcher(None, name, picture_tuples[0]).ratio() >= threshold:
+                image = picture_tuples[1]
+                pictures.remove(picture_tuples)
+        images.append(image)
+    return images
+
+
+def new_matcher(names, pictures, threshold=0.6):
+    matcher = PhotoMatcher(pictures, threshold=threshold)
+    return [None if m is None else pictures[m][1] for m in matcher.match(names)]
+
+
+def main():
+    dishes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    captions = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    names, pictures = make_data(dishes, captions)
+    print('{0} dishes x {1} captions'.format(dishes, captions))
+    results = {}
+    for label, fn in (('all-pairs SequenceMatcher', old_loop), ('PhotoMatcher', new_matcher)):
+        start = time.perf_counter()
+        results[label] = fn(names, pictures)
+        elapsed = time.perf_counter() - start
+        matched = sum(1 for image in results[label] if image is not None)
+        print('{0:<26}: {1:8.3f} s  {2} dishes matched'.format(label, elapsed, matched))
+    old, new = results['all-pairs SequenceMatcher'], results['PhotoMatcher']
+    agree = sum(1 for a, b in zip(old, new) if (a is None) == (b is None))
+    print('dishes where both agree on having a photo: {0}/{1}'.format(agree, dishes))
+
+
+if __name__ == '__main__':
+    main()
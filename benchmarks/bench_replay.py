@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end crawl benchmark served from a cassette, so timings exclude network noise.
+
+Record a cassette once with the network available:
+    python nick_code_final_final.py --record springfield.zip "Springfield, MO"
+then time the crawl offline, as often as needed:
+    python benchmarks/bench_replay.py springfield.zip "Springfield, MO" --repeat 5
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nick_code_final_final  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('cassette')
+    parser.add_argument('locations', nargs='*', default=['Springfield, MO'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    timings = []
+    # Replayed rows and logs go to a scratch directory, never to the crawl's own database and log.
+    workdir = tempfile.mkdtemp(prefix='bench_replay_')
+    try:
+        for run in range(args.repeat):
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                nick_code_final_final.main(args.locations, replay=args.cassette,
+                                           db=os.path.join(workdir, 'run{0}.sqlite'.format(run)),
+                                           log_path=os.path.join(workdir, 'run{0}.log'.format(run)))
+            timings.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(workdir)
+    print('{0} runs of {1}: min {2:.3f} s  median {3:.3f} s  max {4:.3f} s'.format(
+        len(timings), ', '.join(args.locations), min(timings), statistics.median(timings), max(timings)))
+
+
+if __name__ == '__main__':
+    main()
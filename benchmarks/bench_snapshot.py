@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Open time, lookup time and memory of a memory-mapped menu snapshot holding millions of dishes, next to
+loading the same crawl from the SQLite store and from a pickled MenuTable.
+
+    python benchmarks/bench_snapshot.py [items]
+"""
+import os
+import pickle
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from menu import MenuItem, MenuTable  # noqa: E402
+from parser_fixtures import WORDS  # noqa: E402
+from snapshot import Snapshot, export_store  # noqa: E402
+from storage import migrate  # noqa: E402
+
+ITEMS_PER_RESTAURANT = 40
+
+
+def records(count, seed=0):
+    rng = random.Random(seed)
+    names = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title() for _ in range(count // 20 or 1)]
+    for r in range(count // ITEMS_PER_RESTAURANT):
+        items = []
+        for position in range(ITEMS_PER_RESTAURANT):
+            items.append((position, rng.choice(names), None, rng.randint(300, 4000), rng.randint(100, 1500),
+                          None if rng.random() < 0.5 else ' '.join(rng.choice(WORDS) for _ in range(8)),
+                          None if rng.random() < 0.8 else 'https://s3-media.example/{0}-{1}.jpg'.format(r, position)))
+        yield {'place_id': 'ChIJ{0:016x}'.format(rng.getrandbits(64)), 'name': 'Restaurant {0}'.format(r),
+               'location': 'Springfield, MO', 'lat': 37.2, 'lng': -93.3, 'rating': 4.0, 'menu_items': items}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def measure(label, load, lookup, place_ids):
+    tracemalloc.start()
+    held, opened = timed(load)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for place_id in place_ids:
+        lookup(held, place_id)
+    per_lookup = (time.perf_counter() - start) / len(place_ids)
+    print('{0:<10}: open {1:9.2f} ms  lookup {2:8.1f} us  held {3:8.1f} MB'.format(
+        label, opened * 1000, per_lookup * 1e6, size / 1048576.0))
+    return held
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    workdir = tempfile.mkdtemp(prefix='bench_snapshot_')
+    try:
+        db = os.path.join(workdir, 'crawl.sqlite')
+        conn = sqlite3.connect(db, isolation_level=None)
+        migrate(conn, db)
+        conn.execute('BEGIN')
+        place_ids = []
+        for record in records(count):
+            place_ids.append(record['place_id'])
+            conn.execute('INSERT INTO restaurants (place_id, name, location, lat, lng, rating, created_at, updated_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?, 0, 0)', [record[k] for k in ('place_id', 'name', 'location', 'lat',
+                                                                                   'lng', 'rating')])
+            conn.executemany('INSERT INTO menu_items VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             [(record['place_id'],) + item for item in record['menu_items']])
+        conn.execute('COMMIT')
+        conn.close()
+
+        path = os.path.join(workdir, 'crawl.snap')
+        written, seconds = timed(export_store, db, path)
+        print('{0:,} restaurants, {1:,} menu items, {2:,} strings: {3:.1f} MB snapshot written in {4:.1f} s'.format(
+            written['restaurants'], written['items'], written['strings'], os.path.getsize(path) / 1048576.0, seconds))
+
+        table = MenuTable()
+        for record in records(count):
+            table.extend((MenuItem(*item[1:]) for item in record['menu_items']), record['place_id'])
+        pickled = os.path.join(workdir, 'crawl.pickle')
+        with open(pickled, 'wb') as f:
+            pickle.dump(table, f, pickle.HIGHEST_PROTOCOL)
+        del table
+
+        sample = random.Random(1).sample(place_ids, min(1000, len(place_ids)))
+
+        def sqlite_load():
+            return sqlite3.connect(db)
+
+        def sqlite_menu(conn, place_id):
+            return [MenuItem(*row) for row in conn.execute(
+                'SELECT dish_name, dish_size, price_cents, dish_cals, dish_items, image FROM menu_items '
+                'WHERE place_id = ? ORDER BY position', (place_id,))]
+
+        def pickle_load():
+            with open(pickled, 'rb') as f:
+                table = pickle.load(f)
+            rows = {}
+            for i, string_id in enumerate(table.columns['place_id']):
+                rows.setdefault(string_id, []).append(i)
+            return table, dict((table.strings[k], v) for k, v in rows.items())
+
+        def pickle_menu(held, place_id):
+            table, rows = held
+            return [table[i] for i in rows[place_id]]
+
+        measure('sqlite', sqlite_load, sqlite_menu, sample).close()
+        measure('pickle', pickle_load, pickle_menu, sample)
+        snapshot = measure('snapshot', lambda: Snapshot(path), lambda s, p: s.menu(s.find(p)), sample)
+        assert [i.dish_name for i in snapshot.menu(snapshot.find(sample[0]))] == \
+            [i.dish_name for i in pickle_menu(pickle_load(), sample[0])]
+        snapshot.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic generator for the menu-page fixtures used by bench_parsers.py.
+
+The pages mimic each source's markup around the parts the parsers read, padded with the navigation,
+inline scripts, reviews and footers real pages carry, so that sizes and tag counts are realistic.
+Saved real pages can be dropped into benchmarks/fixtures/<source>/ alongside the generated ones.
+"""
+import os
+import random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+WORDS = ['chicken', 'beef', 'pork', 'shrimp', 'salmon', 'tofu', 'bacon', 'cheese', 'spicy', 'grilled', 'fried',
+         'smoked', 'caesar', 'garden', 'buffalo', 'bbq', 'teriyaki', 'sandwich', 'burger', 'salad', 'tacos',
+         'wings', 'pasta', 'pizza', 'soup', 'wrap', 'nachos', 'fries', 'quesadilla', 'platter', 'sliders',
+         'avocado', 'mushroom', 'onion', 'rings', 'pretzel', 'bites', 'egg', 'rolls', 'steak', 'ranch', 'slaw']
+
+
+def _words(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _padding(rng, size):
+    parts = ['<header><nav><ul>']
+    parts.extend('<li class="nav-item"><a href="/section/{0}" class="nav-link">{1}</a></li>'.format(
+        i, _words(rng, 1, 2).title()) for i in range(40))
+    parts.append('</ul></nav></header><script>window.__STATE__ = {')
+    parts.extend('"k{0}": "{1}",'.format(i, _words(rng, 3, 8)) for i in range(200))
+    parts.append('};</script>')
+    total = sum(len(p) for p in parts)
+    review = 0
+    while total < size:
+        block = ('<div class="review"><div class="review-meta"><span class="user">{0}</span>'
+                 '<span class="rating" title="{1} star rating"></span></div>'
+                 '<p class="review-text">{2}</p><ul class="review-actions"><li><a href="#">Useful</a></li>'
+                 '<li><a href="#">Funny</a></li><li><a href="#">Cool</a></li></ul></div>').format(
+            _words(rng, 1, 2).title(), rng.randint(1, 5), _words(rng, 20, 60))
+        parts.append(block)
+        total += len(block)
+        review += 1
+    return ''.join(parts)
+
+
+def _price(rng):
+    return '${0}.{1:02d}'.format(rng.randint(3, 40), rng.choice([0, 25, 49, 50, 95, 99]))
+
+
+def urbanspoon(rng, dishes, padding):
+    items = ''.join(
+        '<div class="tmi tmi-groups"><div class="tmi-group-title bold fontsize3 pb5 bb">Group</div>'
+        '<div class="tmi-name">\n  {0}\n  <div class="tmi-price-txt">{1}</div>\n'
+        '  <div class="tmi-desc-text">{2}</div>\n</div></div>'.format(
+            _words(rng, 2, 4).title(), _price(rng), _words(rng, 6, 14)) for _ in range(dishes))
+    return '<html><head><title>Menu</title></head><body>{0}<div id="menu">{1}</div>{2}</body></html>'.format(
+        padding[:len(padding) // 2], items, padding[len(padding) // 2:])
+
+
+DOLLARS = ['&amp;dollar;', '&dollar;', '&#36;', '&amp;#36;', '$']
+
+
+def custom_site(rng, dishes, padding):
+    # A restaurant-builder site: the nav is a WordPress-style list of menu-item links, and the dishes
+    # are nested blocks whose prices use whichever dollar escaping the builder picked.
+    nav = ''.join('<li class="menu-item menu-item-type-post_type"><a href="/{0}">{1}</a></li>'.format(
+        i, _words(rng, 1, 2).title()) for i in range(30))
+    sections = []
+    for section in range(dishes // 50):
+        items = ''.join(
+            '<div class="menu-item menu-item-{0}"><div class="menu-item-header"><h4 class="menu-item-name">'
+            '{1}</h4><span class="menu-item-price">{2}{3}.{4:02d}</span></div>'
+            '<p class="menu-item-description">{5}</p></div>'.format(
+                section * 50 + i, _words(rng, 2, 4).title(), rng.choice(DOLLARS), rng.randint(4, 40),
+                rng.choice([0, 50, 95]), _words(rng, 8, 20)) for i in range(50))
+        sections.append('<section class="menu-section"><h2>{0}</h2>{1}</section>'.format(
+            _words(rng, 1, 2).title(), items))
+    return '<html><body><ul class="nav">{0}</ul>{1}<main>{2}</main>{3}</body></html>'.format(
+        nav, padding[:len(padding) // 2], ''.join(sections), padding[len(padding) // 2:])
+
+
+def singleplatform(rng, dishes, padding):
+    items = ''.join(
+        '<div class="item"><div class="item-title-row"><h4 class="item-title">\n{0}\n</h4>'
+        '<span class="price">{1}</span></div><div class="description text">{2}</div></div>'.format(
+            _words(rng, 2, 4).title(), _price(rng), _words(rng, 6, 14)) for _ in range(dishes))
+    return '<html><body>{0}<div class="menu"><div class="items">{1}</div></div>{2}</body></html>'.format(
+        padding[:len(padding) // 2], items, padding[len(padding) // 2:])
+
+
+def custom(rng, dishes, padding):
+    items = ''.join(
+        '<li class="menu-item clearfix"><h3 class="menu-item-title">{0}</h3>'
+        '<span class="menu-item-price">&amp;dollar;{1}</span><p>{2}</p></li>'.format(
+            _words(rng, 2, 4).title(), rng.randint(4, 40), _words(rng, 6, 14)) for _ in range(dishes))
+    return '<html><body>{0}<section class="menu"><ul>{1}</ul></section>{2}</body></html>'.format(
+        padding[:len(padding) // 2], items, padding[len(padding) // 2:])
+
+
+def postmates(rng, dishes, padding):
+    items = ''.join(
+        '<div class="catalog-product"><div class="product-image"></div><div class="title">{0}</div>'
+        '<div class="description">{1}</div><div class="price">{2}</div></div>'.format(
+            _words(rng, 2, 4).title(), _words(rng, 6, 14), _price(rng)) for _ in range(dishes))
+    return '<html><body>{0}<div class="catalog">{1}</div>{2}</body></html>'.format(
+        padding[:len(padding) // 2], items, padding[len(padding) // 2:])
+
+
+def allmenus(rng, dishes, padding):
+    items = ''.join(
+        '<li class="menu-items"><div class="item-main"><span class="item-title">{0}</span>'
+        '<span class="item-price">\n {1} \n</span></div><p class="description">{2}</p></li>'.format(
+            _words(rng, 2, 4).title(), _price(rng), _words(rng, 6, 14)) for _ in range(dishes))
+    return '<html><body>{0}<div class="menu"><ul class="menu-category">{1}</ul></div>{2}</body></html>'.format(
+        padding[:len(padding) // 2], items, padding[len(padding) // 2:])
+
+
+# (source, fixture name, generator, number of dishes, approximate padding in bytes)
+FIXTURES = [
+    ('urbanspoon', 'urbanspoon_150', urbanspoon, 150, 120000),
+    ('singleplatform', 'singleplatform_120', singleplatform, 120, 90000),
+    ('custom', 'custom_80', custom, 80, 150000),
+    ('custom', 'custom_site_large', custom_site, 1500, 900000),
+    ('postmates', 'postmates_200', postmates, 200, 200000),
+    ('allmenus', 'allmenus_250', allmenus, 250, 100000),
+    ('allmenus', 'allmenus_large', allmenus, 2500, 600000),
+]
+
+
+def ensure_fixtures(fixture_dir=FIXTURE_DIR):
+    """
+    Writes any generated fixture that isn't on disk yet.
+    :return: dict of source -> list of fixture paths, generated and saved alike
+    """
+    for source, name, generator, dishes, padding in FIXTURES:
+        path = os.path.join(fixture_dir, source, name + '.html')
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            rng = random.Random(name)
+            with open(path, 'wb') as f:
+                f.write(generator(rng, dishes, _padding(rng, padding)).encode('utf-8'))
+    fixtures = {}
+    for source in sorted(os.listdir(fixture_dir)):
+        directory = os.path.join(fixture_dir, source)
+        if os.path.isdir(directory):
+            fixtures[source] = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.html'))
+    return fixtures
+
+
+if __name__ == '__main__':
+    for source, paths in ensure_fixtures().items():
+        for path in paths:
+            print('{0:<16}{1:>10,} bytes  {2}'.format(source, os.path.getsize(path), os.path.basename(path)))
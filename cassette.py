@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import json
+import threading
+import zipfile
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import googleplaces
+
+from fetch import Response
+
+
+class CassetteMiss(Exception):
+    """
+    Raised in replay mode for a request that was never recorded.
+    """
+
+
+def _normalize_url(url, drop=('key',)):
+    parts = urlparse(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in drop)
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+def _body_key(data):
+    if data is None:
+        return ''
+    if isinstance(data, dict):
+        return urlencode(sorted((str(k), str(v)) for k, v in data.items()))
+    if isinstance(data, str):
+        return data
+    return hashlib.sha256(data).hexdigest()
+
+
+class Cassette:
+    """
+    Zip archive of every exchange made during a crawl: HTTP requests from the fetch layer, googleplaces
+    API calls and rendered browser pages. In 'record' mode exchanges are appended as they happen; in
+    'replay' mode they are served back in recorded order without touching the network.
+    """
+    def __init__(self, path, mode='replay'):
+        if mode not in ('record', 'replay'):
+            raise ValueError('mode must be record or replay, not {0}'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = []
+        if mode == 'record':
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+            self._tapes = None
+        else:
+            self._zip = zipfile.ZipFile(path, 'r')
+            self._index = json.loads(self._zip.read('index.json').decode('utf-8'))
+            self._tapes = {}
+            for entry in self._index:
+                self._tapes.setdefault(entry['key'], []).append(entry)
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    @staticmethod
+    def key(kind, method, url, data=None):
+        return '{0} {1} {2} {3}'.format(kind, method.upper(), _normalize_url(url), _body_key(data))
+
+    def record(self, key, meta, content):
+        with self._lock:
+            name = 'bodies/{0}'.format(len(self._index))
+            self._zip.writestr(name, content)
+            self._index.append({'key': key, 'meta': meta, 'body': name})
+
+    def play(self, key):
+        """
+        Returns the next recorded exchange for key. Once a key's exchanges run out, the last one repeats.
+        :return: (meta dict, bytes)
+        """
+        with self._lock:
+            tape = self._tapes.get(key)
+            if not tape:
+                self.misses += 1
+                raise CassetteMiss(key)
+            entry = tape.pop(0) if len(tape) > 1 else tape[0]
+            return entry['meta'], self._zip.read(entry['body'])
+
+    def close(self):
+        with self._lock:
+            if self.recording:
+                self._zip.writestr('index.json', json.dumps(self._index))
+            self._zip.close()
+
+    # HTTP, called by AsyncFetcher._send
+
+    def record_response(self, method, url, data, response):
+        self.record(self.key('http', method, url, data),
+                    {'url': response.url, 'status': response.status_code,
+                     'headers': dict(response.headers), 'encoding': response.encoding},
+                    response.content)
+
+    def play_response(self, method, url, data=None):
+        meta, content = self.play(self.key('http', method, url, data))
+        return Response(meta['url'], meta['status'], meta['headers'], content, meta['encoding'])
+
+    # Rendered pages, called by BrowserPool.render
+
+    def record_page(self, url, page_source, anchors):
+        self.record(self.key('page', 'GET', url), {'anchors': anchors}, page_source.encode('utf-8'))
+
+    def play_page(self, url):
+        meta, content = self.play(self.key('page', 'GET', url))
+        return content.decode('utf-8'), [tuple(anchor) for anchor in meta['anchors']]
+
+    # googleplaces, whose module-level _fetch_remote every API call goes through
+
+    def patch_googleplaces(self):
+        """
+        Routes googleplaces API calls through the cassette. Undo with unpatch_googleplaces().
+        """
+        original = googleplaces._fetch_remote
+        cassette = self
+
+        def fetch_remote(service_url, params=None, use_http_post=False):
+            method = 'POST' if use_http_post else 'GET'
+            # The API key is left out so a cassette can be replayed with any key, or none.
+            key = cassette.key('places', method, service_url,
+                               dict((k, v) for k, v in (params or {}).items() if k != 'key'))
+            if cassette.replaying:
+                meta, content = cassette.play(key)
+            else:
+                request_url, response = original(service_url, params, use_http_post)
+                content = response.read()
+                meta = {'url': _normalize_url(request_url), 'headers': dict(response.headers)}
+                cassette.record(key, meta, content)
+            return meta['url'], _RecordedFile(meta['url'], meta['headers'], content)
+
+        fetch_remote.original = original
+        googleplaces._fetch_remote = fetch_remote
+
+    @staticmethod
+    def unpatch_googleplaces():
+        original = getattr(googleplaces._fetch_remote, 'original', None)
+        if original is not None:
+            googleplaces._fetch_remote = original
+
+
+class _RecordedFile(io.BytesIO):
+    """
+    The parts of urllib's response object that googleplaces reads.
+    """
+    def __init__(self, url, headers, content):
+        super().__init__(content)
+        self.url = url
+        self.headers = headers
+
+    def geturl(self):
+        return self.url
+
+
+class ReplayBrowserPool:
+    """
+    Stands in for BrowserPool during replay: rendered pages come from the cassette, no Chrome is started.
+    """
+    def __init__(self, cassette, size=4, readiness=None):
+        self.cassette = cassette
+        self.size = size
+        self.readiness = readiness
+
+    def render(self, url, logger):
+        return self.cassette.play_page(url)
+
+    def quit(self):
+        pass
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+import threading
+import time
+
+from menu import MenuItem
+
+STAGES = ('menu', 'pictures', 'calories', 'stored')
+
+
+def restaurant_state(restaurant):
+    """
+    The parts of a Restaurant that later stages build on, as JSON-friendly values.
+    :param restaurant: Restaurant
+    :return: dict
+    """
+    return {
+        'menu_link': restaurant.menu_link,
+        'phone_numbers': restaurant.phone_numbers,
+        'emails': restaurant.emails,
+        'menu_url': restaurant.menu_url,
+        'menu_hash': restaurant.menu_hash,
+        'menu': [(item.dish_name, item.dish_size, item.dish_price, item.dish_cals, item.dish_items, item.image)
+                 for item in restaurant.menu],
+    }
+
+
+def restore_restaurant(restaurant, state):
+    """
+    Puts a restaurant_state back onto a freshly built Restaurant.
+    :param restaurant: Restaurant
+    :param state: dict
+    """
+    link = state['menu_link']
+    restaurant.menu_link = tuple(link) if isinstance(link, list) else link
+    restaurant.phone_numbers = state['phone_numbers']
+    restaurant.emails = state['emails']
+    restaurant.menu_url, restaurant.menu_hash = state['menu_url'], state['menu_hash']
+    restaurant.menu = [MenuItem(*item) for item in state['menu']]
+
+
+class CrawlCheckpoint:
+    """
+    Durable progress of the location crawls, so a run that dies partway resumes where it stopped.
+    Per location it keeps the Places page being worked on with the page token that fetches it, and per
+    place_id the stages already completed along with the restaurant's state after the last one, and the
+    places whose gather raised, so they get another try before the location is done.
+    A location's checkpoint is dropped once its last page is done, so the next scheduled run starts over.
+    Lives in its own tables, by default in the CrawlStore database.
+    """
+    def __init__(self, path='trans_database.sqlite'):
+        self.path = path
+        self.resumed = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS checkpoint_locations ('
+                           'location TEXT PRIMARY KEY, page INTEGER NOT NULL, page_token TEXT, updated_at REAL NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS checkpoint_places ('
+                           'location TEXT NOT NULL, place_id TEXT NOT NULL, stages TEXT NOT NULL, state TEXT, '
+                           'updated_at REAL NOT NULL, PRIMARY KEY (location, place_id))')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS checkpoint_failed ('
+                           'location TEXT NOT NULL, place_id TEXT NOT NULL, error TEXT, failed_at REAL NOT NULL, '
+                           'PRIMARY KEY (location, place_id))')
+
+    def cursor(self, location):
+        """
+        :param location: str
+        :return: (page number, page token) to resume from; (0, None) starts with the text search
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT page, page_token FROM checkpoint_locations WHERE location = ?',
+                                     (location,)).fetchone()
+        return tuple(row) if row is not None else (0, None)
+
+    def page_done(self, location, page, next_page_token):
+        """
+        Moves the cursor past a finished page, or drops the location's checkpoint if it was the last one.
+        :param location: str
+        :param page: int, the page just finished
+        :param next_page_token: str, or None when there are no more pages
+        """
+        with self._lock:
+            if next_page_token is None:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.execute('DELETE FROM checkpoint_places WHERE location = ?', (location,))
+                self._conn.execute('DELETE FROM checkpoint_failed WHERE location = ?', (location,))
+                self._conn.execute('DELETE FROM checkpoint_locations WHERE location = ?', (location,))
+                self._conn.execute('COMMIT')
+            else:
+                self._conn.execute('INSERT OR REPLACE INTO checkpoint_locations VALUES (?, ?, ?, ?)',
+                                   (location, page + 1, next_page_token, time.time()))
+
+    def stages(self, location, place_id):
+        """
+        :param location: str
+        :param place_id: str
+        :return: (set of completed stages, restaurant_state dict or None)
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT stages, state FROM checkpoint_places WHERE location = ? AND place_id = ?',
+                                     (location, place_id)).fetchone()
+        if row is None:
+            return set(), None
+        return set(row[0].split(',')) - {''}, json.loads(row[1]) if row[1] else None
+
+    def resume(self, location, restaurant):
+        """
+        Restores a Restaurant to where an earlier run left it: fills in restaurant.stages, and the menu link,
+        contacts and menu as they were after its last completed stage.
+        :param location: str
+        :param restaurant: Restaurant, freshly built from its Places result
+        :return: set of completed stages
+        """
+        restaurant.stages, state = self.stages(location, restaurant.place_id)
+        if state is not None:
+            restore_restaurant(restaurant, state)
+            self.resumed += 1
+        return restaurant.stages
+
+    def stage_done(self, location, restaurant, stage):
+        """
+        Records that a stage finished for a restaurant, along with its state at that point.
+        :param location: str
+        :param restaurant: Restaurant
+        :param stage: str, one of STAGES
+        """
+        restaurant.stages.add(stage)
+        stages = ','.join(s for s in STAGES if s in restaurant.stages)
+        state = None if stage == 'stored' else json.dumps(restaurant_state(restaurant))
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO checkpoint_places VALUES (?, ?, ?, ?, ?)',
+                               (location, restaurant.place_id, stages, state, time.time()))
+
+    def place_failed(self, location, place_id, error):
+        """
+        Records a place whose gather raised, so that it is retried even once the cursor has moved past its page.
+        :param location: str
+        :param place_id: str
+        :param error: Exception
+        """
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO checkpoint_failed VALUES (?, ?, ?, ?)',
+                               (location, place_id, str(error), time.time()))
+
+    def place_retried(self, location, place_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM checkpoint_failed WHERE location = ? AND place_id = ?',
+                               (location, place_id))
+
+    def failed_places(self, location):
+        """
+        :param location: str
+        :return: list of place_ids whose gather raised and that haven't been retried successfully since
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT place_id FROM checkpoint_failed WHERE location = ? '
+                                      'ORDER BY failed_at, rowid', (location,)).fetchall()
+        return [row[0] for row in rows]
+
+    def clear(self, location=None):
+        """
+        Forgets the progress of one location, or of all of them.
+        :param location: str
+        """
+        where, args = (' WHERE location = ?', (location,)) if location else ('', ())
+        with self._lock:
+            self._conn.execute('DELETE FROM checkpoint_places' + where, args)
+            self._conn.execute('DELETE FROM checkpoint_failed' + where, args)
+            self._conn.execute('DELETE FROM checkpoint_locations' + where, args)
+
+    def stats(self):
+        with self._lock:
+            locations = self._conn.execute('SELECT COUNT(*) FROM checkpoint_locations').fetchone()[0]
+            places = self._conn.execute('SELECT COUNT(*) FROM checkpoint_places').fetchone()[0]
+            failed = self._conn.execute('SELECT COUNT(*) FROM checkpoint_failed').fetchone()[0]
+        return {'locations': locations, 'places': places, 'failed': failed, 'resumed': self.resumed}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
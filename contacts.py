@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import html
+import re
+from urllib.parse import unquote
+
+# No pattern is anchored to the whole page. Each one starts with a literal ('@', 'tel:', 'mailto:') that
+# the regex engine scans for, or is built only from bounded quantifiers. So a page is scanned in linear time.
+PHONE = re.compile(r'(?<![\w+])(?:\+?1[\s.-]?)?\(?([2-9]\d\d)(?:\)\s?|[\s.-])([2-9]\d\d)[\s.-](\d{4})(?![\w-])')
+# Run on the lowercased page: a case-sensitive literal prefix is found far faster than an IGNORECASE one.
+TEL_LINK = re.compile(r'tel:([+\d()\s.%-]{7,32})')
+MAILTO_LINK = re.compile(r'mailto:([^"\'\s?>]{3,254})')
+EMAIL_LOCAL = re.compile(r'[A-Za-z0-9._%+-]{1,64}')
+EMAIL_DOMAIN = re.compile(r'(?:[A-Za-z0-9-]{1,63}\.){1,8}[A-Za-z]{2,24}(?![\w-])')
+EMAIL_AT_DOMAIN = re.compile('@' + EMAIL_DOMAIN.pattern)
+# Asset names such as logo@2x.png look like addresses to the pattern above.
+NOT_EMAIL_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.js', '.css')
+
+
+def _text(page):
+    if isinstance(page, bytes):
+        page = page.decode('utf-8', errors='replace')
+    if '&#' in page or '&commat;' in page:
+        page = html.unescape(page)
+    return page
+
+
+def normalize_phone(value):
+    """
+    :param value: str, a phone number in any common notation
+    :return: str, '(417) 555-0123' for North American numbers, '+<digits>' for others, None if too short
+    """
+    digits = ''.join(c for c in value if c.isdigit())
+    if len(digits) == 11 and digits[0] == '1':
+        digits = digits[1:]
+    if len(digits) == 10:
+        return '({0}) {1}-{2}'.format(digits[:3], digits[3:6], digits[6:])
+    if 7 < len(digits) <= 15:
+        return '+' + digits
+    return None
+
+
+def normalize_email(value):
+    """
+    :param value: str
+    :return: str, lowercased address, or None if it isn't one
+    """
+    value = value.strip().strip('.').lower()
+    local, _, domain = value.partition('@')
+    if not local or not EMAIL_DOMAIN.fullmatch(domain) or domain.endswith(NOT_EMAIL_SUFFIXES):
+        return None
+    return value
+
+
+def _emails(text):
+    for domain in EMAIL_AT_DOMAIN.finditer(text):
+        at = domain.start()
+        if at:
+            # The local part is matched on the reversed 64 characters before the '@', in one attempt.
+            local = EMAIL_LOCAL.match(text[at - 1:at - 65:-1] if at > 64 else text[at - 1::-1])
+            if local:
+                yield local.group(0)[::-1] + domain.group(0)
+
+
+def extract_contacts(page):
+    """
+    Pulls phone numbers and email addresses out of a page: tel: and mailto: links first, then the text.
+    Works on rendered page sources and raw HTTP bodies alike.
+    :param page: str or bytes
+    :return: tuple of (phones, emails), each a list of normalized values in page order without repeats
+    """
+    text = _text(page)
+    lowered = text.lower()
+    phones, emails = [], []
+    for match in TEL_LINK.finditer(lowered):
+        phones.append(normalize_phone(unquote(match.group(1))))
+    for match in PHONE.finditer(text):
+        phones.append(normalize_phone(''.join(match.groups())))
+    for match in MAILTO_LINK.finditer(lowered):
+        emails.append(normalize_email(unquote(match.group(1))))
+    emails.extend(normalize_email(email) for email in _emails(text))
+    return _unique(phones), _unique(emails)
+
+
+def _unique(values):
+    seen = set()
+    return [v for v in values if v is not None and not (v in seen or seen.add(v))]
+
+
+def merge(existing, found, normalize):
+    """
+    Appends the values in found that aren't already in existing, comparing normalized forms.
+    :param existing: list, altered in place
+    :param found: iterable of normalized values
+    :param normalize: function used on the values already in existing
+    :return: list, existing
+    """
+    seen = set(normalize(v) for v in existing if v)
+    for value in found:
+        if value not in seen:
+            seen.add(value)
+            existing.append(value)
+    return existing
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from multidict import CIMultiDict
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+
+class Response:
+    """
+    Minimal stand-in for requests.Response, so the scrapers can keep using .content, .url and .json().
+    """
+    def __init__(self, url, status_code, headers, content, encoding=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CIMultiDict(headers)
+        self.content = content
+        self.encoding = encoding
+        self.complete = True
+
+    def __repr__(self):
+        return '<Response [{0}] {1}>'.format(self.status_code, self.url)
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _feed(content, consume, chunk_size):
+    for start in range(0, len(content), chunk_size):
+        if consume(content[start:start + chunk_size]):
+            return start + chunk_size >= len(content)
+    return True
+
+
+class AsyncFetcher:
+    """
+    asyncio HTTP transport. A single instance keeps up to `concurrency` requests in flight at once,
+    at most `per_host` of them (and that many pooled keep-alive connections) to any one host.
+    """
+    def __init__(self, concurrency=100, per_host=10, timeout=30, keepalive_timeout=60, headers=None, cache=None,
+                 cassette=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.headers = dict(DEFAULT_HEADERS)
+        self.headers.update(headers or {})
+        self.cache = cache
+        self.cassette = cassette
+        self._session = None
+        self._semaphore = None
+
+    async def _get_session(self):
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency,
+                                               limit_per_host=self.per_host,
+                                               keepalive_timeout=self.keepalive_timeout),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+                auto_decompress=True
+            )
+        return self._session
+
+    async def offload(self, fn, *args):
+        """
+        Runs blocking or CPU-bound work (parsing, hashing, cache I/O) on the loop's executor, so one page
+        being parsed doesn't stall every other request in flight.
+        :return: fn's result
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+    async def _send(self, method, url, **kwargs):
+        if self.cassette is not None and self.cassette.replaying:
+            return self.cassette.play_response(method, url, kwargs.get('data'))
+        session = await self._get_session()
+        async with self._semaphore:
+            async with session.request(method, url, **kwargs) as resp:
+                content = await resp.read()
+                r = Response(str(resp.url), resp.status, resp.headers, content, resp.charset)
+        if self.cassette is not None:
+            self.cassette.record_response(method, url, kwargs.get('data'), r)
+        return r
+
+    async def request(self, method, url, use_cache=True, **kwargs):
+        """
+        Performs a single request and reads the whole body. GETs go through the HttpCache, if there is one:
+        fresh entries are served from disk and stale ones are revalidated with a conditional request.
+        :param method: str
+        :param url: str
+        :param use_cache: bool, False to always go to the network, e.g. for pages carrying CSRF tokens
+        :return: Response
+        """
+        if self.cache is None or not use_cache or method != 'GET':
+            return await self._send(method, url, **kwargs)
+        entry = await self.offload(self.cache.lookup, method, url)
+        if entry is not None:
+            if self.cache.is_fresh(entry):
+                self.cache.hits += 1
+                return await self.offload(self.cache.response, entry)
+            headers = dict(kwargs.pop('headers', None) or {})
+            headers.update(self.cache.conditional_headers(entry))
+            kwargs['headers'] = headers
+        r = await self._send(method, url, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            self.cache.revalidated += 1
+            return await self.offload(self.cache.refresh, entry, r.headers)
+        self.cache.misses += 1
+        await self.offload(self.cache.store, method, url, r)
+        return r
+
+    async def stream(self, url, consume, chunk_size=65536, use_cache=True, **kwargs):
+        """
+        GETs a url and hands its body to consume() chunk by chunk as it arrives. As soon as consume returns
+        True the rest of the body is abandoned and the connection dropped. Fresh HttpCache entries are
+        streamed from disk, and stale ones are revalidated like in request(), feeding the cached body on a 304.
+        A body cut short is never stored, since a later full read can't tell it from the whole page.
+        :param url: str
+        :param consume: function taking a bytes chunk, returning True to stop
+        :param chunk_size: int
+        :param use_cache: bool
+        :return: Response whose content holds the bytes read, complete=False if the read stopped early
+        """
+        entry = None
+        if self.cache is not None and use_cache:
+            entry = await self.offload(self.cache.lookup, 'GET', url)
+            if entry is not None and self.cache.is_fresh(entry):
+                self.cache.hits += 1
+                r = await self.offload(self.cache.response, entry)
+                r.complete = await self.offload(_feed, r.content, consume, chunk_size)
+                return r
+            if entry is not None:
+                headers = dict(kwargs.pop('headers', None) or {})
+                headers.update(self.cache.conditional_headers(entry))
+                kwargs['headers'] = headers
+        if self.cassette is not None and self.cassette.replaying:
+            r = self.cassette.play_response('GET', url)
+            if r.status_code != 304:
+                r.complete = await self.offload(_feed, r.content, consume, chunk_size)
+        else:
+            r = await self._stream(url, consume, chunk_size, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            self.cache.revalidated += 1
+            r = await self.offload(self.cache.refresh, entry, r.headers)
+            r.complete = await self.offload(_feed, r.content, consume, chunk_size)
+            return r
+        if self.cache is not None and use_cache:
+            self.cache.misses += 1
+            if r.complete:
+                await self.offload(self.cache.store, 'GET', url, r)
+        return r
+
+    async def _stream(self, url, consume, chunk_size, **kwargs):
+        session = await self._get_session()
+        chunks = []
+        complete = True
+        async with self._semaphore:
+            async with session.get(url, **kwargs) as resp:
+                if resp.status != 304:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        chunks.append(chunk)
+                        if await self.offload(consume, chunk):
+                            complete = resp.content.at_eof()
+                            break
+                r = Response(str(resp.url), resp.status, resp.headers, b''.join(chunks), resp.charset)
+        r.complete = complete
+        if self.cassette is not None:
+            # A body cut short is recorded as read, so replay stops at the same place.
+            self.cassette.record_response('GET', url, None, r)
+        return r
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, data=None, **kwargs):
+        return await self.request('POST', url, data=data, **kwargs)
+
+    async def get_many(self, urls, **kwargs):
+        """
+        Fetches every url concurrently. Failed fetches are returned as their exception, in place.
+        :param urls: list of str
+        :return: list of Response or Exception
+        """
+        return await asyncio.gather(*[self.get(url, **kwargs) for url in urls], return_exceptions=True)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class Fetcher:
+    """
+    Synchronous facade over AsyncFetcher. The event loop lives on a daemon thread, so blocking
+    callers such as gather_data_for_place and coroutines submitted through run() share one transport.
+    The loop thread only moves bytes: parsing and cache I/O go through offload() to `workers` threads.
+    """
+    def __init__(self, workers=8, **kwargs):
+        self.aio = AsyncFetcher(**kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetcher-work'))
+        self._thread = threading.Thread(target=self._loop.run_forever, name='fetcher-loop', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, coro):
+        """
+        Runs a coroutine on the fetcher's loop and blocks until it finishes.
+        :param coro: coroutine
+        :return: the coroutine's result
+        """
+        return self.submit(coro).result()
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on the fetcher's loop without waiting for it.
+        :param coro: coroutine
+        :return: concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def get(self, url, **kwargs):
+        return self.run(self.aio.get(url, **kwargs))
+
+    def post(self, url, data=None, **kwargs):
+        return self.run(self.aio.post(url, data=data, **kwargs))
+
+    def get_many(self, urls, **kwargs):
+        return self.run(self.aio.get_many(urls, **kwargs))
+
+    async def aget(self, url, **kwargs):
+        return await self.aio.get(url, **kwargs)
+
+    async def apost(self, url, data=None, **kwargs):
+        return await self.aio.post(url, data=data, **kwargs)
+
+    async def astream(self, url, consume, **kwargs):
+        return await self.aio.stream(url, consume, **kwargs)
+
+    async def offload(self, fn, *args):
+        return await self.aio.offload(fn, *args)
+
+    def close(self):
+        if self._thread.is_alive():
+            self.run(self.aio.close())
+            self.run(self._loop.shutdown_default_executor())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+
+_shared_fetcher = None
+_shared_kwargs = None
+_shared_pid = None
+_shared_lock = threading.Lock()
+
+
+def get_fetcher(**kwargs):
+    """
+    Returns the process-wide Fetcher, creating it on first use.
+    Pool sizes, headers and the cache can only be configured by the first caller; later callers pass
+    nothing, or the same settings. Anything else raises ValueError rather than being silently ignored.
+    A forked child never uses its parent's Fetcher, whose loop thread did not survive the fork.
+    :return: Fetcher
+    """
+    global _shared_fetcher, _shared_kwargs, _shared_pid
+    with _shared_lock:
+        if _shared_fetcher is None or _shared_pid != os.getpid():
+            _shared_fetcher = Fetcher(**kwargs)
+            _shared_kwargs = kwargs
+            _shared_pid = os.getpid()
+        elif kwargs and kwargs != _shared_kwargs:
+            raise ValueError('The shared Fetcher was already created with {0}, not {1}; '
+                             'close_fetcher() it first'.format(_shared_kwargs, kwargs))
+        return _shared_fetcher
+
+
+def close_fetcher():
+    global _shared_fetcher, _shared_kwargs
+    with _shared_lock:
+        if _shared_fetcher is not None and _shared_pid == os.getpid():
+            _shared_fetcher.close()
+        _shared_fetcher = _shared_kwargs = None
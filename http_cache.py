@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlparse
+
+from multidict import CIMultiDict
+
+from fetch import Response
+
+
+def _parse_cache_control(value):
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') or True
+    return directives
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class CacheEntry:
+    def __init__(self, key, url, status_code, headers, digest, stored_at):
+        self.key = key
+        self.url = url
+        self.status_code = status_code
+        self.headers = CIMultiDict(headers)
+        self.digest = digest
+        self.stored_at = stored_at
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('Last-Modified')
+
+
+class HttpCache:
+    """
+    Content-addressed on-disk HTTP cache for the shared fetch layer. Bodies are stored once per sha256
+    under root/objects, and an SQLite index maps each url to its headers and body digest.
+    Cache-Control (no-store, no-cache, max-age, s-maxage) and Expires decide freshness; stale entries
+    with an ETag or Last-Modified are revalidated with If-None-Match / If-Modified-Since.
+    host_ttls overrides the freshness lifetime, in seconds, for whole hosts (0 = always revalidate).
+    """
+    def __init__(self, root='http_cache', host_ttls=None, default_ttl=0):
+        self.root = root
+        self.host_ttls = dict(host_ttls or {})
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite'), timeout=30,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                           'key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, '
+                           'headers TEXT NOT NULL, digest TEXT NOT NULL, stored_at REAL NOT NULL)')
+
+    @staticmethod
+    def key(method, url):
+        return '{0} {1}'.format(method.upper(), url)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def lookup(self, method, url):
+        """
+        :return: CacheEntry, or None if the url was never cached
+        """
+        key = self.key(method, url)
+        with self._lock:
+            row = self._conn.execute('SELECT url, status, headers, digest, stored_at FROM responses WHERE key = ?',
+                                     (key,)).fetchone()
+        if row is None or not os.path.exists(self._object_path(row[3])):
+            return None
+        return CacheEntry(key, row[0], row[1], json.loads(row[2]), row[3], row[4])
+
+    def freshness_lifetime(self, entry):
+        host = urlparse(entry.url).hostname
+        if host in self.host_ttls:
+            return self.host_ttls[host]
+        cache_control = _parse_cache_control(entry.headers.get('Cache-Control'))
+        if 'no-cache' in cache_control:
+            return 0
+        for directive in ('s-maxage', 'max-age'):
+            if directive in cache_control:
+                try:
+                    return int(cache_control[directive])
+                except ValueError:
+                    return 0
+        expires, date = _http_date(entry.headers.get('Expires')), _http_date(entry.headers.get('Date'))
+        if expires is not None:
+            return max(0, expires - (date or entry.stored_at))
+        last_modified = _http_date(entry.last_modified)
+        if last_modified is not None:
+            # RFC 7234 heuristic: a tenth of the document's age when it was fetched.
+            return max(0, ((date or entry.stored_at) - last_modified) / 10)
+        return self.default_ttl
+
+    def is_fresh(self, entry, now=None):
+        now = time.time() if now is None else now
+        return now - entry.stored_at < self.freshness_lifetime(entry)
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def response(self, entry):
+        with open(self._object_path(entry.digest), 'rb') as f:
+            content = f.read()
+        match = re.search(r'charset=([\w-]+)', entry.headers.get('Content-Type', ''))
+        return Response(entry.url, entry.status_code, entry.headers, content, match and match.group(1))
+
+    def store(self, method, url, response):
+        """
+        Caches a response unless it is an error or marked no-store.
+        :return: bool, whether it was stored
+        """
+        cache_control = _parse_cache_control(response.headers.get('Cache-Control'))
+        if response.status_code != 200 or 'no-store' in cache_control:
+            return False
+        digest = hashlib.sha256(response.content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(response.content)
+            os.replace(tmp, path)
+        headers = CIMultiDict(response.headers)
+        headers.popall('Content-Encoding', None)
+        headers.popall('Content-Length', None)
+        headers.popall('Set-Cookie', None)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                               (self.key(method, url), response.url, response.status_code,
+                                json.dumps(dict(headers)), digest, time.time()))
+        return True
+
+    def refresh(self, entry, not_modified_headers):
+        """
+        Applies a 304's headers to a cached entry and restarts its freshness clock.
+        :return: Response built from the cached body
+        """
+        for name in ('Cache-Control', 'Expires', 'ETag', 'Last-Modified', 'Date'):
+            if name in not_modified_headers:
+                entry.headers[name] = not_modified_headers[name]
+        entry.headers.setdefault('Date', formatdate(usegmt=True))
+        entry.stored_at = time.time()
+        with self._lock:
+            self._conn.execute('UPDATE responses SET headers = ?, stored_at = ? WHERE key = ?',
+                               (json.dumps(dict(entry.headers)), entry.stored_at, entry.key))
+        return self.response(entry)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import re
+import sys
+from array import array
+
+from text import dish_text
+
+AMOUNT = re.compile(r'(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?')
+MISSING = -1
+
+
+def _string(value, intern=False):
+    if value is None:
+        return None
+    text = ' '.join(dish_text(value).split())
+    if not text:
+        return None
+    return sys.intern(text) if intern else text
+
+
+def parse_cents(price):
+    """
+    :param price: str, bytes, int or None, e.g. '$9.95', b'12', '1,200.00', 'N/A'
+    :return: int, the first amount in cents, or None when there is none
+    """
+    if price is None or isinstance(price, int):
+        return price
+    match = AMOUNT.search(dish_text(price))
+    if match is None:
+        return None
+    return int(match.group(1).replace(',', '')) * 100 + int((match.group(2) or '0').ljust(2, '0'))
+
+
+def parse_count(value):
+    """
+    :param value: str, bytes, int or None, e.g. MyFitnessPal's '1,200' or 'N/A'
+    :return: int or None
+    """
+    if value is None or isinstance(value, int):
+        return value
+    match = AMOUNT.search(dish_text(value))
+    return int(match.group(1).replace(',', '')) if match else None
+
+
+def format_cents(cents):
+    return None if cents is None else '${0}.{1:02d}'.format(cents // 100, cents % 100)
+
+
+class MenuItem:
+    """
+    Handles dish data, and a separate method for gathering calories for a given dish.
+    Whatever a scraper hands in is normalized on assignment: names and sizes become interned str,
+    prices integer cents and calories an int, each None when missing.
+    """
+    __slots__ = ('_dish_name', '_dish_size', '_dish_price', '_dish_cals', 'dish_items', 'image')
+
+    def __init__(self, dish_name, dish_size, dish_price, dish_cals, dish_items, image=None):
+        self.dish_name = dish_name
+        self.dish_size = dish_size
+        self.dish_price = dish_price
+        self.dish_cals = dish_cals
+        self.dish_items = _string(dish_items)
+        self.image = image
+
+    def __repr__(self):
+        return "{0},{1}".format(self.dish_name, self.image)
+
+    @property
+    def dish_name(self):
+        return self._dish_name
+
+    @dish_name.setter
+    def dish_name(self, value):
+        self._dish_name = _string(value, intern=True) or ''
+
+    @property
+    def dish_size(self):
+        return self._dish_size
+
+    @dish_size.setter
+    def dish_size(self, value):
+        self._dish_size = _string(value, intern=True)
+
+    @property
+    def dish_price(self):
+        """
+        :return: int, cents
+        """
+        return self._dish_price
+
+    @dish_price.setter
+    def dish_price(self, value):
+        self._dish_price = parse_cents(value)
+
+    @property
+    def dish_cals(self):
+        return self._dish_cals
+
+    @dish_cals.setter
+    def dish_cals(self, value):
+        self._dish_cals = parse_count(value)
+
+    def gather_dish_cals(self, nutrition=None, fetcher=None):
+        """
+        Uses MyFitnessPal.com to gather caloric and other nutritional info.
+        :param nutrition: NutritionClient shared across the run; a throwaway one is used if omitted
+        :param fetcher: Fetcher for the throwaway client, the process-wide one if omitted
+        """
+        if nutrition is None:
+            # Imported here so the data classes load without the HTTP stack.
+            from fetch import get_fetcher
+            from nutrition import NutritionClient
+            nutrition = NutritionClient(fetcher if fetcher is not None else get_fetcher())
+        self.dish_cals = nutrition.lookup(self.dish_name)
+
+
+class MenuTable:
+    """
+    Columnar container for the menu items of a restaurant or a whole city. Each field is a parallel
+    array: prices and calories as 64-bit ints (MISSING for None), names, sizes, descriptions, images and
+    owning place_ids as 32-bit indexes into one shared table of distinct strings, with 0 meaning None.
+    Rows are read back as MenuItem objects, or column by column.
+    """
+    STRING_COLUMNS = ('place_id', 'dish_name', 'dish_size', 'dish_items', 'image')
+
+    def __init__(self, items=(), place_id=None):
+        self.strings = [None]
+        self._string_ids = {None: 0}
+        self.columns = dict((name, array('I')) for name in self.STRING_COLUMNS)
+        self.columns['dish_price'] = array('q')
+        self.columns['dish_cals'] = array('q')
+        self.extend(items, place_id)
+
+    def __len__(self):
+        return len(self.columns['dish_name'])
+
+    def _string_id(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def append(self, item, place_id=None):
+        """
+        :param item: MenuItem
+        :param place_id: str, the restaurant the item belongs to
+        """
+        columns = self.columns
+        columns['place_id'].append(self._string_id(place_id))
+        columns['dish_name'].append(self._string_id(item.dish_name))
+        columns['dish_size'].append(self._string_id(item.dish_size))
+        columns['dish_items'].append(self._string_id(item.dish_items))
+        columns['image'].append(self._string_id(item.image))
+        columns['dish_price'].append(MISSING if item.dish_price is None else item.dish_price)
+        columns['dish_cals'].append(MISSING if item.dish_cals is None else item.dish_cals)
+
+    def extend(self, items, place_id=None):
+        for item in items:
+            self.append(item, place_id)
+
+    def column(self, name):
+        """
+        :param name: str, a MenuItem field or 'place_id'
+        :return: list of the column's values, with None for missing ones
+        """
+        values = self.columns[name]
+        if name in self.STRING_COLUMNS:
+            strings = self.strings
+            return [strings[i] for i in values]
+        return [None if v == MISSING else v for v in values]
+
+    def place_id(self, index):
+        return self.strings[self.columns['place_id'][index]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        strings, columns = self.strings, self.columns
+        price, cals = columns['dish_price'][index], columns['dish_cals'][index]
+        return MenuItem(dish_name=strings[columns['dish_name'][index]],
+                        dish_size=strings[columns['dish_size'][index]],
+                        dish_price=None if price == MISSING else price,
+                        dish_cals=None if cals == MISSING else cals,
+                        dish_items=strings[columns['dish_items'][index]],
+                        image=strings[columns['image'][index]])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+import html
+import re
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = lxml_html = None
+
+# 'lxml' parses in C and runs each plan's compiled XPath; 'html.parser' is the pure-python fallback,
+# which with PARTIAL only builds the subtrees a plan's strainer lets through.
+BACKEND = 'lxml' if lxml_html is not None else 'html.parser'
+PARTIAL = True
+
+
+def configure(backend=None, partial=None):
+    """
+    :param backend: str, 'lxml' or 'html.parser'
+    :param partial: bool, whether the html.parser path strains out everything but the plan's rows
+    :return: None
+    """
+    global BACKEND, PARTIAL
+    if backend is not None:
+        BACKEND = backend
+    if partial is not None:
+        PARTIAL = partial
+
+
+def _class_token(name):
+    # Strainers see the raw class attribute, so match one whitespace-separated token of it.
+    return re.compile(r'(?:^|\s){0}(?:\s|$)'.format(re.escape(name)))
+
+
+def _xpath(steps, relative=False):
+    path = '.' if relative else ''
+    for tag, class_ in steps:
+        path += '//{0}'.format(tag or '*')
+        if class_:
+            path += "[contains(concat(' ', normalize-space(@class), ' '), ' {0} ')]".format(class_)
+    return path or '.'
+
+
+class ExtractionPlan:
+    """
+    Where one source keeps its menu, declared once. `rows` is a path of (tag, class) steps to one
+    element per dish, and `fields` maps each value to a path below its row plus an attribute to read,
+    or None for the text. The plan is compiled to XPath for lxml and to a SoupStrainer plus find_all
+    calls for html.parser, so both backends extract the same dicts.
+    """
+    def __init__(self, name, rows, fields):
+        self.name = name
+        self.rows = rows
+        self.fields = fields
+        tag, class_ = rows[0]
+        self.strainer = SoupStrainer(tag, class_=_class_token(class_) if class_ else None)
+        if etree is not None:
+            self.row_xpath = etree.XPath(_xpath(rows))
+            self.field_xpaths = dict((field, etree.XPath(_xpath(steps, relative=True)))
+                                     for field, (steps, attr) in fields.items())
+
+    def extract(self, content):
+        """
+        :param content: bytes or str, the page
+        :return: list of dicts, field -> str, or None where a row lacks the field
+        """
+        if not content:
+            return []
+        if BACKEND == 'lxml' and lxml_html is not None:
+            try:
+                return self._extract_lxml(content)
+            except (etree.ParserError, ValueError):
+                pass
+        return self._extract_soup(content)
+
+    def _extract_lxml(self, content):
+        if isinstance(content, bytes):
+            content = UnicodeDammit(content, is_html=True).unicode_markup
+        document = lxml_html.document_fromstring(content)
+        records = []
+        for row in self.row_xpath(document):
+            record = {}
+            for field, (steps, attr) in self.fields.items():
+                found = self.field_xpaths[field](row)
+                if not found:
+                    record[field] = None
+                elif attr:
+                    record[field] = found[0].get(attr)
+                else:
+                    record[field] = found[0].text_content()
+            records.append(record)
+        return records
+
+    def _extract_soup(self, content):
+        soup = BeautifulSoup(content, 'html.parser', parse_only=self.strainer if PARTIAL else None)
+        rows = [soup]
+        for tag, class_ in self.rows:
+            rows = [found for row in rows for found in row.find_all(tag, class_=class_)]
+        records = []
+        for row in rows:
+            record = {}
+            for field, (steps, attr) in self.fields.items():
+                found = row
+                for tag, class_ in steps:
+                    found = found.find(tag, class_=class_)
+                    if found is None:
+                        break
+                if found is None:
+                    record[field] = None
+                elif attr:
+                    record[field] = found.get(attr)
+                else:
+                    record[field] = found.text
+            records.append(record)
+        return records
+
+
+PLANS = {
+    'urbanspoon_link': ExtractionPlan('urbanspoon_link', [('a', 'zred')], {'href': ([], 'href')}),
+    'urbanspoon': ExtractionPlan('urbanspoon', [('div', 'tmi'), ('div', 'tmi-name')], {'text': ([], None)}),
+    'custom': ExtractionPlan('custom', [(None, 'menu-item')], {'text': ([], None)}),
+    'singleplatform': ExtractionPlan('singleplatform', [('div', 'items'), ('div', 'item')], {
+        'title': ([('h4', 'item-title')], None),
+        'description': ([('div', 'description')], None),
+        'price': ([('span', 'price')], None),
+    }),
+    'postmates': ExtractionPlan('postmates', [('div', 'catalog-product')], {
+        'title': ([('div', 'title')], None),
+        'price': ([('div', 'price')], None),
+    }),
+    'allmenus_results': ExtractionPlan('allmenus_results', [('li', 'restaurant-list-item')], {
+        'name': ([('h4', 'name')], None),
+        'href': ([('a', None)], 'href'),
+    }),
+    'allmenus': ExtractionPlan('allmenus', [('li', 'menu-items')], {
+        'title': ([('span', 'item-title')], None),
+        'price': ([('span', 'item-price')], None),
+    }),
+}
+
+
+PRICE = re.compile(r'(\$?\d+)')
+
+
+def _dish(dish_name, dish_price, dish_items=None, dish_size=None, dish_cals=None):
+    return {'dish_name': dish_name, 'dish_size': dish_size, 'dish_price': dish_price,
+            'dish_cals': dish_cals, 'dish_items': dish_items}
+
+
+def _strip(value):
+    return value.strip() if value is not None else None
+
+
+def parse_urbanspoon_link(content):
+    """
+    :param content: bytes, an urbanspoon restaurant page
+    :return: str, link to its full menu
+    """
+    return PLANS['urbanspoon_link'].extract(content)[0]['href']
+
+
+def parse_urbanspoon_menu(content):
+    """
+    :param content: bytes, an urbanspoon full menu page
+    :return: list of MenuItem keyword dicts
+    """
+    dishes = []
+    for record in PLANS['urbanspoon'].extract(content):
+        dish_data = [i.strip() for i in record['text'].splitlines() if len(i.strip()) > 1]
+        if not dish_data:
+            continue
+        dish_data.extend([''] * (3 - len(dish_data)))
+        dishes.append(_dish(dish_name=dish_data[0], dish_price=dish_data[1], dish_items=dish_data[2]))
+    return dishes
+
+
+def parse_custom_menu(content):
+    """
+    Parses a restaurant's own menu page 'the hard way', from every tag with a menu-item class.
+    Each item's text is read once and never re-parsed. Site builders often escape the dollar sign
+    twice ('&amp;dollar;', '&amp;#36;'), so whatever entities are left in the text are decoded before
+    the price is picked out.
+    :param content: bytes
+    :return: list of MenuItem keyword dicts
+    """
+    dishes = []
+    for record in PLANS['custom'].extract(content):
+        menu_item = record['text']
+        if '&' in menu_item:
+            menu_item = html.unescape(menu_item)
+        match = PRICE.search(menu_item)
+        price = match.group(1) if match else 'N/A'
+        name = menu_item.replace(price, '')
+        lines = [i.strip().encode('utf-8') for i in name.splitlines() if len(i.strip()) > 0]
+        if lines:
+            dishes.append(_dish(dish_name=lines[0], dish_price=price))
+    return dishes
+
+
+def parse_singleplatform_menu(content):
+    """
+    :param content: bytes, a singleplatform menu page
+    :return: list of MenuItem keyword dicts
+    """
+    dishes = []
+    for record in PLANS['singleplatform'].extract(content):
+        if record['title'] is None:
+            continue
+        dishes.append(_dish(dish_name=[i.strip().encode('utf-8') for i in record['title'].strip().splitlines() if len(i.strip()) > 1],
+                            dish_price=_strip(record['price']),
+                            dish_items=_strip(record['description'])))
+    return dishes
+
+
+def parse_postmates_menu(content):
+    """
+    :param content: bytes, a postmates store page
+    :return: list of MenuItem keyword dicts
+    """
+    dishes = []
+    for record in PLANS['postmates'].extract(content):
+        if record['title'] is None or record['price'] is None:
+            continue
+        dishes.append(_dish(dish_name=record['title'].strip().encode('utf-8'),
+                            dish_price=record['price'].strip().encode('utf-8')))
+    return dishes
+
+
+def parse_allmenus_results(content, name):
+    """
+    :param content: bytes, an allmenus search results page
+    :param name: str, the restaurant's name
+    :return: list of menu urls for results whose name contains the restaurant's first word
+    """
+    links = []
+    for record in PLANS['allmenus_results'].extract(content):
+        if record['name'] is not None and record['href'] and name.split()[0] in record['name']:
+            links.append('https://www.allmenus.com' + record['href'])
+    return links
+
+
+def parse_allmenus_menu(content):
+    """
+    :param content: bytes, an allmenus menu page
+    :return: list of MenuItem keyword dicts
+    """
+    dishes = []
+    for record in PLANS['allmenus'].extract(content):
+        if record['title'] is None or record['price'] is None:
+            continue
+        dishes.append(_dish(dish_name=record['title'], dish_price=record['price'].strip()))
+    return dishes
+
+
+# Registered domain -> the scrape_menu source that reads menus hosted there.
+MENU_HOSTS = {
+    'urbanspoon.com': 'urbanspoon',
+    'singleplatform.com': 'singleplatform',
+    'singleplatform.co': 'singleplatform',
+    'allmenus.com': 'allmenus',
+    'postmates.com': 'postmates',
+}
+# Links in Maps pages sit in HTML attributes and in JS strings, where '/' may be escaped as '\/'.
+LINK = re.compile(rb'https?:\\?/\\?/(?:[^"\'\s<>\\]|\\/|\\u[0-9a-fA-F]{4})+')
+JS_ESCAPE = re.compile(r'\\u([0-9a-fA-F]{4})')
+LINK_SEPARATORS = (b'"', b"'", b'<', b'>', b' ', b'\n')
+
+
+def menu_source(link):
+    """
+    :param link: str
+    :return: str, the scrape_menu source for a known menu host, or None
+    """
+    host = (urlsplit(link).hostname or '').split('.')
+    for labels in (2, 3):
+        source = MENU_HOSTS.get('.'.join(host[-labels:]))
+        if source is not None:
+            return source
+    return None
+
+
+class MenuLinkScanner:
+    """
+    Finds the first link to a known menu host in a page fed to it in chunks, as they arrive.
+    Only the bytes after the last separator of a chunk are carried over, so a link split between
+    two chunks is still seen and nothing is scanned twice.
+    """
+    def __init__(self, max_carry=8192):
+        self.max_carry = max_carry
+        self.links = 0
+        self.found = None
+        self._carry = b''
+
+    def feed(self, chunk):
+        """
+        :param chunk: bytes
+        :return: bool, True once a menu link has been found
+        """
+        data = self._carry + chunk
+        cut = max(data.rfind(separator) for separator in LINK_SEPARATORS) + 1
+        self._carry = data[cut:][-self.max_carry:]
+        return self._scan(data[:cut])
+
+    def close(self):
+        """
+        Scans whatever is left once the body has ended.
+        :return: bool, True if a menu link has been found
+        """
+        data, self._carry = self._carry, b''
+        return self._scan(data)
+
+    def _scan(self, data):
+        if self.found is None:
+            for match in LINK.finditer(data):
+                self.links += 1
+                link = match.group(0).replace(b'\\/', b'/').decode('utf-8', errors='replace')
+                link = html.unescape(JS_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), link))
+                source = menu_source(link)
+                if source is not None:
+                    self.found = link, source
+                    break
+        return self.found is not None
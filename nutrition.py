@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bs4 import BeautifulSoup
+
+from text import dish_text
+
+MFP_URL = 'http://www.myfitnesspal.com'
+
+
+def normalize_dish_name(dish_name):
+    """
+    Reduces a dish name to its cache key: lower case, punctuation dropped, whitespace collapsed.
+    :param dish_name: str, bytes or list
+    :return: str
+    """
+    dish_name = re.sub(r'[^\w\s]', ' ', dish_text(dish_name).lower())
+    return ' '.join(dish_name.split())
+
+
+class NutritionCache:
+    """
+    On-disk cache of MyFitnessPal lookups keyed by normalized dish name. Backed by SQLite in WAL mode,
+    so it survives across runs and can be shared by several worker processes.
+    Entries expire after `ttl` seconds and the least recently used ones are evicted past `max_entries`.
+    Lookups only read: hit/miss counters are kept in memory and access times are only refreshed once
+    older than `touch_interval`, both written in one batch on writes, stats() and close().
+    """
+    def __init__(self, path='nutrition_cache.sqlite', ttl=30 * 24 * 3600, max_entries=100000,
+                 touch_interval=3600, touch_batch=100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._unsaved_hits = 0
+        self._unsaved_misses = 0
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS nutrition ('
+                           'name TEXT PRIMARY KEY, cals TEXT, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS nutrition_accessed_at ON nutrition (accessed_at)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS nutrition_stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.execute("INSERT OR IGNORE INTO nutrition_stats VALUES ('hits', 0), ('misses', 0)")
+
+    def __contains__(self, dish_name):
+        key = normalize_dish_name(dish_name)
+        with self._lock:
+            row = self._conn.execute('SELECT stored_at FROM nutrition WHERE name = ?', (key,)).fetchone()
+        return row is not None and row[0] + self.ttl > time.time()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM nutrition').fetchone()[0]
+
+    def get(self, dish_name):
+        """
+        :param dish_name: str, bytes or list
+        :return: cached calories, or None on a miss or an expired entry
+        """
+        key = normalize_dish_name(dish_name)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT cals, stored_at, accessed_at FROM nutrition WHERE name = ?',
+                                     (key,)).fetchone()
+            if row is None or row[1] + self.ttl <= now:
+                self.misses += 1
+                self._unsaved_misses += 1
+                return None
+            self.hits += 1
+            self._unsaved_hits += 1
+            if row[2] + self.touch_interval <= now:
+                self._touched[key] = now
+                if len(self._touched) >= self.touch_batch:
+                    self._save()
+            return row[0]
+
+    def set(self, dish_name, cals):
+        key = normalize_dish_name(dish_name)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO nutrition VALUES (?, ?, ?, ?)', (key, cals, now, now))
+            self._touched.pop(key, None)
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._save()
+                self._evict(now)
+
+    def _save(self):
+        # Access times and counters gathered since the last call, in one write transaction.
+        if not (self._touched or self._unsaved_hits or self._unsaved_misses):
+            return
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.executemany('UPDATE nutrition SET accessed_at = MAX(accessed_at, ?) WHERE name = ?',
+                                   [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._conn.executemany('UPDATE nutrition_stats SET value = value + ? WHERE key = ?',
+                                   [(self._unsaved_hits, 'hits'), (self._unsaved_misses, 'misses')])
+        except sqlite3.Error:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+        self._touched.clear()
+        self._unsaved_hits = self._unsaved_misses = 0
+
+    def _evict(self, now):
+        self._conn.execute('DELETE FROM nutrition WHERE stored_at <= ?', (now - self.ttl,))
+        self._conn.execute('DELETE FROM nutrition WHERE name IN ('
+                           'SELECT name FROM nutrition ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                           (self.max_entries,))
+
+    def evict(self):
+        """
+        Drops expired entries and trims the cache to max_entries. set() does this every 100 writes.
+        """
+        with self._lock:
+            self._save()
+            self._evict(time.time())
+
+    def stats(self):
+        """
+        :return: dict of hit/miss counters for this process and for every process sharing the file
+        """
+        with self._lock:
+            self._save()
+            totals = dict(self._conn.execute('SELECT key, value FROM nutrition_stats').fetchall())
+            entries = self._conn.execute('SELECT COUNT(*) FROM nutrition').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'total_hits': totals['hits'],
+            'total_misses': totals['misses'],
+            'entries': entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._save()
+            self._conn.close()
+
+
+class NutritionClient:
+    """
+    Long-lived MyFitnessPal client shared by every MenuItem in a run. The CSRF token is scraped once
+    and only refreshed when a search is rejected, so a lookup costs the search POST plus the detail
+    page, or just the search when that detail page has already been seen.
+    """
+    def __init__(self, fetcher, cache=None, detail_cache_size=10000):
+        self.fetcher = fetcher
+        self.cache = cache
+        self.detail_cache_size = detail_cache_size
+        self.requests_made = 0
+        self.token_refreshes = 0
+        self._token = None
+        self._token_lock = threading.Lock()
+        self._details = OrderedDict()
+        self._details_lock = threading.Lock()
+
+    def _get(self, url):
+        self.requests_made += 1
+        return self.fetcher.get(url)
+
+    def _refresh_token(self, stale=None):
+        """
+        Fetches a new CSRF token unless another thread already replaced the stale one.
+        :param stale: str, the token that was just rejected
+        :return: str
+        """
+        with self._token_lock:
+            if self._token is None or self._token == stale:
+                self.requests_made += 1
+                r = self.fetcher.get(MFP_URL + '/food/calorie-chart-nutrition-facts', use_cache=False)
+                soup = BeautifulSoup(r.content, 'html.parser')
+                self._token = soup.find('meta', attrs={'name': 'csrf-token'}).get('content')
+                self.token_refreshes += 1
+            return self._token
+
+    def _search(self, search, token):
+        self.requests_made += 1
+        return self.fetcher.post(MFP_URL + '/food/search',
+                                 data={
+                                     'utf8': '✓',
+                                     'authenticity_token': token,
+                                     'search': search,
+                                     'commit': 'Search'
+                                 })
+
+    @staticmethod
+    def _is_auth_failure(r):
+        # Rails answers a stale authenticity_token with 422, or bounces the session to the login page.
+        return r.status_code in (401, 403, 422) or '/account/login' in r.url
+
+    def _detail_cals(self, href):
+        with self._details_lock:
+            if href in self._details:
+                self._details.move_to_end(href)
+                return self._details[href]
+        r = self._get(MFP_URL + href)
+        soup = BeautifulSoup(r.content, 'html.parser')
+        try:
+            cals = soup.find('table', attrs={'id': 'nutrition-facts'}).find('td', class_='col-2').text.strip()
+        except AttributeError:
+            cals = 'N/A'
+        with self._details_lock:
+            self._details[href] = cals
+            if len(self._details) > self.detail_cache_size:
+                self._details.popitem(last=False)
+        return cals
+
+    def lookup(self, dish_name):
+        """
+        Gathers the calories for one dish, from the cache if possible.
+        :param dish_name: str, bytes or list
+        :return: str, 'N/A' when MyFitnessPal has no match
+        """
+        if self.cache is not None:
+            cached = self.cache.get(dish_name)
+            if cached is not None:
+                return cached
+        # The normalized name is only the cache key; MyFitnessPal ranks results better on the name as written.
+        search = ' '.join(dish_text(dish_name).split())
+        token = self._token or self._refresh_token()
+        r = self._search(search, token)
+        if self._is_auth_failure(r):
+            r = self._search(search, self._refresh_token(stale=token))
+        soup = BeautifulSoup(r.content, 'html.parser')
+        try:
+            href = soup.find('ul', class_='food_search_results').find('li').find('a').get('href')
+        except AttributeError:
+            href = None
+        cals = self._detail_cals(href) if href else 'N/A'
+        if self.cache is not None:
+            self.cache.set(dish_name, cals)
+        return cals
+
+    def stats(self):
+        stats = {'requests_made': self.requests_made, 'token_refreshes': self.token_refreshes}
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        return stats
+
+
+def enrich_calories(items, nutrition, workers=16, logger=None):
+    """
+    Batch calorie enrichment. Items from any number of restaurants are grouped by normalized dish name,
+    each distinct name is looked up once on a bounded thread pool, and dish_cals is written back to
+    every item sharing that name. A name whose lookup raises leaves its items untouched.
+    :param items: iterable of MenuItem
+    :param nutrition: NutritionClient
+    :param workers: int, maximum lookups in flight
+    :param logger: logging.Logger
+    :return: dict with the item, distinct-name and failure counts
+    """
+    groups = OrderedDict()
+    for item in items:
+        groups.setdefault(normalize_dish_name(item.dish_name), []).append(item)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(nutrition.lookup, group[0].dish_name): name for name, group in groups.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                cals = future.result()
+            except Exception as e:
+                failures += 1
+                if logger is not None:
+                    logger.log(msg='Calorie lookup failed for {0}: {1}'.format(name, e), level=logging.WARNING)
+                continue
+            for item in groups[name]:
+                item.dish_cals = cals
+    return {'items': sum(len(group) for group in groups.values()), 'names': len(groups), 'failures': failures}
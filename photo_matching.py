@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from difflib import SequenceMatcher
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from text import dish_text
+
+
+def _features(text, ngram):
+    text = ' '.join(text.lower().split())
+    padded = ' {0} '.format(text)
+    grams = [padded[i:i + ngram] for i in range(max(len(padded) - ngram + 1, 1))]
+    return grams + ['w:' + word for word in text.split()]
+
+
+class PhotoMatcher:
+    """
+    Matches dish names to Yelp photo captions. Captions are indexed once as L2-normalised vectors of
+    character n-grams and words, every dish is scored against every caption with one sparse product,
+    and only each dish's best `candidates` captions not yet assigned are scored with
+    SequenceMatcher(...).ratio(). The highest ratio wins if it passes the old `ratio >= threshold` rule.
+    Each photo is assigned to at most one dish.
+    """
+    def __init__(self, pictures, threshold=0.6, ngram=3, candidates=10):
+        """
+        :param pictures: list of (caption, image url) tuples
+        """
+        self.pictures = list(pictures)
+        self.threshold = threshold
+        self.ngram = ngram
+        self.candidates = candidates
+        self.captions = [dish_text(p[0]) for p in self.pictures]
+        self.vocabulary = {}
+        self.index = self._vectorize(self.captions, grow=True)
+
+    def _vectorize(self, texts, grow=False):
+        rows, cols, values = [], [], []
+        norms = np.zeros(len(texts))
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in _features(text, self.ngram):
+                counts[feature] = counts.get(feature, 0) + 1
+            # Unknown features still count toward the norm, so they lower the cosine as they should.
+            norms[row] = np.sqrt(sum(c * c for c in counts.values())) or 1.0
+            for feature, count in counts.items():
+                col = self.vocabulary.get(feature)
+                if col is None:
+                    if not grow:
+                        continue
+                    col = self.vocabulary[feature] = len(self.vocabulary)
+                rows.append(row)
+                cols.append(col)
+                values.append(count / norms[row])
+        return sparse.csr_matrix((values, (rows, cols)), shape=(len(texts), len(self.vocabulary)))
+
+    def scores(self, dish_names):
+        """
+        :param dish_names: list of dish names
+        :return: numpy array of cosine similarities, dishes x photos
+        """
+        if not self.pictures or not dish_names:
+            return np.zeros((len(dish_names), len(self.pictures)))
+        queries = self._vectorize([dish_text(name) for name in dish_names])
+        return (queries @ self.index.T).toarray()
+
+    def match(self, dish_names):
+        """
+        Greedily gives each dish, in order, the unassigned candidate photo with the highest SequenceMatcher
+        ratio, if that passes the threshold. Equal ratios go to the caption with the higher cosine score.
+        :param dish_names: list of dish names
+        :return: list with the index into pictures, or None, for every dish
+        """
+        scores = self.scores(dish_names)
+        assigned = set()
+        result = []
+        for row, name in enumerate(dish_names):
+            text = dish_text(name)
+            match = None
+            # Photos already taken don't count toward the candidates, so the window widens past them:
+            # at most len(assigned) of the top candidates + len(assigned) columns can be taken.
+            k = min(self.candidates + len(assigned), len(self.pictures))
+            if k:
+                top = np.argpartition(-scores[row], k - 1)[:k]
+                tried = 0
+                best = self.threshold
+                for col in top[np.argsort(-scores[row][top], kind='stable')]:
+                    if scores[row][col] <= 0 or tried == self.candidates:
+                        break
+                    if col in assigned:
+                        continue
+                    tried += 1
+                    ratio = SequenceMatcher(None, text, self.captions[col]).ratio()
+                    if ratio > best or match is None and ratio >= best:
+                        match, best = int(col), ratio
+                if match is not None:
+                    assigned.add(match)
+            result.append(match)
+        return result
+
+
+def assign_pictures(menu, pictures, threshold=0.6, logger=None):
+    """
+    Sets MenuItem.image from the best matching Yelp photo.
+    :param menu: list of MenuItem
+    :param pictures: list of (caption, image url) tuples
+    :param threshold: float, minimum SequenceMatcher ratio for a match
+    :return: list of the pictures that matched no dish
+    """
+    matcher = PhotoMatcher(pictures, threshold=threshold)
+    matches = matcher.match([item.dish_name for item in menu])
+    for item, match in zip(menu, matches):
+        if match is not None:
+            item.image = matcher.pictures[match][1]
+            if logger is not None:
+                logger.log(msg='Picture match found for {0}.'.format(dish_text(item.dish_name)), level=logging.INFO)
+    used = set(m for m in matches if m is not None)
+    return [picture for i, picture in enumerate(matcher.pictures) if i not in used]
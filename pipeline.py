@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import logging
+import queue
+import threading
+import time
+
+from googleplaces import GooglePlacesError
+
+_DONE = object()
+
+
+def places_pages(google_places_api, location, page=0, page_token=None, retries=5, retry_delay=1.0, logger=None):
+    """
+    Pages through the Places search for a location. Google hands out the next page token a moment before it
+    becomes usable and answers INVALID_REQUEST until then, so a new token is retried with a short backoff
+    rather than treated as the end of the results.
+    :param google_places_api: GooglePlaces
+    :param location: str
+    :param page: int, number of the page page_token fetches
+    :param page_token: str, resume from this page instead of starting with the text search, unless it has expired
+    :param retries: int, attempts per page token before giving up on it
+    :param retry_delay: float, seconds before the first retry, doubled after each one
+    :return: generator of (page number, query results)
+    """
+    results = None
+    if page_token is not None:
+        try:
+            results = _next_page(google_places_api, page_token, retries, retry_delay, logger)
+        except GooglePlacesError as e:
+            # Saved page tokens expire; start the pages over instead.
+            if logger is not None:
+                logger.log(msg='Page token for {0} rejected ({1}), restarting its pages.'.format(location, e),
+                           level=logging.WARNING)
+            page = 0
+    if results is None:
+        results = google_places_api.text_search(query='restaurants', location='{0}'.format(location).encode('utf-8'))
+    while True:
+        yield page, results
+        if not results.has_next_page_token:
+            return
+        results = _next_page(google_places_api, results.next_page_token, retries, retry_delay, logger)
+        page += 1
+
+
+def _next_page(google_places_api, page_token, retries, retry_delay, logger):
+    for attempt in range(retries):
+        try:
+            return google_places_api.nearby_search(pagetoken=page_token)
+        except GooglePlacesError as e:
+            if 'INVALID_REQUEST' not in str(e) or attempt == retries - 1:
+                raise
+            if logger is not None:
+                logger.log(msg='Page token not ready yet, retrying in {0:.1f}s.'.format(retry_delay),
+                           level=logging.INFO)
+            time.sleep(retry_delay)
+            retry_delay *= 2
+
+
+class PlacesPipeline:
+    """
+    Runs a location's Places results through three stages at once: a producer thread pages through the
+    search, fetching each next page as soon as its token works, and feeds places into a bounded queue;
+    `workers` threads take places off it and build their restaurants with gather(place); the calling
+    thread collects finished restaurants by page and hands every complete page to finish(page, restaurants,
+    next_page_token), strictly in page order. The bounded queue keeps the producer at most `maxsize`
+    places ahead of the workers. A place whose gather raises is logged, handed to fail(page, place, error)
+    and left out of its page.
+    """
+    def __init__(self, pages, gather, finish, workers=4, maxsize=None, keep=None, fail=None, logger=None):
+        """
+        :param pages: iterable of (page number, query results), e.g. places_pages()
+        :param gather: function taking (index, place), returning a Restaurant
+        :param finish: function taking (page number, list of Restaurant, next page token or None)
+        :param workers: int
+        :param maxsize: int, bound of the places queue, twice the workers by default
+        :param keep: function taking a place, False to leave it out, e.g. because an earlier run stored it
+        :param fail: function taking (page number, place, exception), called before the page can finish
+        """
+        self.pages = pages
+        self.gather = gather
+        self.finish = finish
+        self.workers = workers
+        self.maxsize = maxsize or 2 * workers
+        self.keep = keep
+        self.fail = fail
+        self.logger = logger
+        self.places = queue.Queue(self.maxsize)
+        self.results = queue.Queue()
+        self.max_depth = 0
+        self.pages_fetched = 0
+        self.places_queued = 0
+        self.restaurants = 0
+        self.failed = 0
+        self._stop = threading.Event()
+
+    def _log(self, msg, level=logging.INFO):
+        if self.logger is not None:
+            self.logger.log(msg=msg, level=level)
+
+    def _put(self, item):
+        # Blocks while the queue is full, but gives up once the pipeline is stopped.
+        while not self._stop.is_set():
+            try:
+                self.places.put(item, timeout=0.1)
+                self.max_depth = max(self.max_depth, self.places.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            index = 0
+            for page, results in self.pages:
+                places = [place for place in results.places if self.keep is None or self.keep(place)]
+                self.pages_fetched += 1
+                next_page_token = results.next_page_token if results.has_next_page_token else None
+                self.results.put(('page', page, len(places), next_page_token))
+                for place in places:
+                    if not self._put((page, index, place)):
+                        return
+                    self.places_queued += 1
+                    index += 1
+        except Exception as e:
+            # Same as running out of pages: what was fetched is finished, and a checkpoint keeps the token.
+            self._log('Stopped paging: {0}'.format(e), level=logging.WARNING)
+        finally:
+            self.results.put(('done',))
+            for _ in range(self.workers):
+                self._put(_DONE)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                item = self.places.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            page, index, place = item
+            try:
+                self.results.put(('restaurant', page, self.gather(index, place)))
+            except Exception as e:
+                self._log('Failed to gather {0}: {1}'.format(place.name, e), level=logging.WARNING)
+                if self.fail is not None:
+                    try:
+                        self.fail(page, place, e)
+                    except Exception as fail_error:
+                        self._log('Failed to record {0}: {1}'.format(place.name, fail_error), level=logging.WARNING)
+                self.results.put(('failed', page))
+
+    def run(self):
+        """
+        Runs the pipeline until every page is finished, or until finish raises.
+        :return: dict of stats()
+        """
+        threads = [threading.Thread(target=self._produce, name='places-producer', daemon=True)]
+        threads += [threading.Thread(target=self._work, name='places-worker-{0}'.format(i), daemon=True)
+                    for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        pages = {}
+        next_page = None
+        produced = False
+        finished = False
+        try:
+            while not produced or pages:
+                message = self.results.get()
+                if message[0] == 'done':
+                    produced = True
+                elif message[0] == 'page':
+                    _, page, count, next_page_token = message
+                    pages[page] = {'count': count, 'next_page_token': next_page_token, 'restaurants': [], 'seen': 0}
+                    next_page = page if next_page is None else next_page
+                else:
+                    entry = pages[message[1]]
+                    entry['seen'] += 1
+                    if message[0] == 'restaurant':
+                        entry['restaurants'].append(message[2])
+                        self.restaurants += 1
+                    else:
+                        self.failed += 1
+                while next_page in pages and pages[next_page]['seen'] == pages[next_page]['count']:
+                    entry = pages.pop(next_page)
+                    self._log('Finished results page {0}, {1} places queued.'.format(next_page, self.places.qsize()))
+                    self.finish(next_page, entry['restaurants'], entry['next_page_token'])
+                    next_page += 1
+            finished = True
+        finally:
+            # On an error, workers still busy with a place are left to notice the stop on their own.
+            self._stop.set()
+            for thread in threads:
+                thread.join(None if finished else 0)
+        return self.stats()
+
+    def stats(self):
+        """
+        :return: dict with the places queue's current and highest depth and counts of what went through it
+        """
+        return {'queue_depth': self.places.qsize(), 'max_depth': self.max_depth, 'maxsize': self.maxsize,
+                'pages': self.pages_fetched, 'places': self.places_queued, 'restaurants': self.restaurants,
+                'failed': self.failed}
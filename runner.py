@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import atexit
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from queue import Empty
+
+from checkpoint import CrawlCheckpoint
+from snapshot import export_store
+
+
+def log_path(location):
+    return 'restaurant_scraper.{0}.log'.format(re.sub(r'\W+', '_', location).strip('_'))
+
+
+_session = None
+
+
+def init_worker(options):
+    """
+    Worker process initializer: builds the process's CrawlSession, with its browsers, fetcher and caches,
+    which every location the worker is handed then reuses, and closes it when the process exits.
+    :param options: dict of CrawlSession keyword arguments
+    """
+    global _session
+    from nick_code_final_final import CrawlSession, initialize_logging
+    logger = initialize_logging('restaurant_scraper.worker-{0}.log'.format(os.getpid()))
+    _session = CrawlSession(logger=logger, **options)
+    atexit.register(_session.close)
+
+
+def crawl_location(location, options, progress):
+    """
+    Worker process entry point: crawls one location with the worker's CrawlSession, storing into the
+    shared database through its CrawlStore.
+    :param location: str
+    :param options: dict of CrawlSession.crawl keyword arguments
+    :param progress: queue that page progress dicts are put on
+    :return: dict, the session's counts for the location
+    """
+    from nick_code_final_final import initialize_logging
+    # Same logger the session holds, writing to the location's own file from here on.
+    initialize_logging(log_path(location))
+    return _session.crawl([location], progress=progress.put, **options)
+
+
+class CrawlProgress:
+    """
+    The coordinator's combined view of every worker: pages and restaurants finished per location,
+    and totals across all of them.
+    """
+    def __init__(self, locations, logger=None):
+        self.locations = dict((location, {'pages': 0, 'restaurants': 0, 'unchanged': 0, 'failed': 0,
+                                          'status': 'queued'}) for location in locations)
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.started = time.monotonic()
+
+    def update(self, event):
+        entry = self.locations[event['location']]
+        entry['status'] = 'crawling'
+        entry['pages'] += 1
+        entry['restaurants'] += event['restaurants']
+        entry['unchanged'] += event['unchanged']
+        entry['failed'] = event['failed']
+        self.report('{0} page {1}: {2} restaurants, {3} places queued'.format(
+            event['location'], event['page'], event['restaurants'], event['queue_depth']))
+
+    def finished(self, location, error=None):
+        self.locations[location]['status'] = 'error' if error is not None else 'done'
+        self.report('{0} {1}{2}'.format(location, self.locations[location]['status'],
+                                        ': {0}'.format(error) if error is not None else ''))
+
+    def totals(self):
+        totals = {'locations': len(self.locations), 'seconds': time.monotonic() - self.started}
+        for entry in self.locations.values():
+            totals[entry['status']] = totals.get(entry['status'], 0) + 1
+            for key in ('pages', 'restaurants', 'unchanged', 'failed'):
+                totals[key] = totals.get(key, 0) + entry[key]
+        return totals
+
+    def report(self, msg):
+        totals = self.totals()
+        line = '[{0}/{1} locations done, {2} restaurants, {3} unchanged, {4} failed, {5:.0f}s] {6}'.format(
+            totals.get('done', 0) + totals.get('error', 0), totals['locations'], totals['restaurants'],
+            totals['unchanged'], totals['failed'], totals['seconds'], msg)
+        self.logger.log(msg=line, level=logging.INFO)
+
+
+def run_locations(locations, processes=None, db='trans_database.sqlite', snapshot=None, restart=False,
+                  incremental=False, browsers=4, logger=None):
+    """
+    Crawls every location in a pool of worker processes, one location per task, so a long list of cities
+    keeps every core busy. Each worker is a spawned process that builds its BrowserPool, fetcher and
+    nutrition client once and reuses them for every location it is handed; all of them store into the
+    one db, whose writes SQLite serializes, and report page progress back to this coordinator.
+    :param locations: list of str
+    :param processes: int, number of worker processes, one per core by default
+    :param db: str
+    :param snapshot: str, path of a snapshot of the db to write once every location is done
+    :param restart: bool, drop leftover checkpoints before starting
+    :param incremental: bool
+    :param browsers: int, BrowserPool size of each worker
+    :return: dict, combined totals plus each location's counts under 'results'
+    """
+    if restart:
+        checkpoint = CrawlCheckpoint(db)
+        checkpoint.clear()
+        checkpoint.close()
+    session_options = {'db': db, 'browsers': browsers}
+    options = {'incremental': incremental}
+    view = CrawlProgress(locations, logger)
+    results = {}
+    # Spawned rather than forked: Chrome, Xvfb and the fetcher's event loop thread don't survive a fork.
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        progress = manager.Queue()
+        with ProcessPoolExecutor(max_workers=processes or multiprocessing.cpu_count(), mp_context=context,
+                                 initializer=init_worker, initargs=(session_options,)) as pool:
+            pending = dict((pool.submit(crawl_location, location, options, progress), location)
+                           for location in locations)
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                _drain(progress, view)
+                for future in done:
+                    location = pending.pop(future)
+                    try:
+                        results[location] = future.result()
+                        view.finished(location)
+                    except Exception as e:
+                        view.finished(location, error=e)
+        _drain(progress, view)
+    totals = view.totals()
+    totals['results'] = results
+    if snapshot:
+        totals['snapshot'] = export_store(db, snapshot)
+    view.report('Finished: {0}'.format(dict((k, v) for k, v in totals.items() if k != 'results')))
+    return totals
+
+
+def _drain(progress, view):
+    while True:
+        try:
+            view.update(progress.get_nowait())
+        except Empty:
+            return
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from urllib.parse import quote
+
+from menu import MISSING, MenuItem
+from storage import SCHEMA_VERSION
+
+MAGIC = b'TDBSNAP1'
+SECTIONS = ('restaurants', 'dish_name', 'dish_size', 'dish_items', 'image', 'price_cents', 'dish_cals',
+            'string_offsets', 'heap')
+# magic, restaurant count, item count, string count, then the byte offset of each section
+HEADER = struct.Struct('<8sQQQ{0}Q'.format(len(SECTIONS)))
+# string ids of RESTAURANT_FIELDS, lat, lng, rating, first item, item count, padding
+RESTAURANT = struct.Struct('<8I3dQII')
+RESTAURANT_FIELDS = ('place_id', 'name', 'location', 'address', 'website', 'maps_url', 'menu_link', 'menu_source')
+NUMBER_FIELDS = ('lat', 'lng', 'rating')
+STRING_COLUMNS = ('dish_name', 'dish_size', 'dish_items', 'image')
+INT_COLUMNS = ('price_cents', 'dish_cals')
+
+
+def _aligned(offset):
+    return (offset + 7) & ~7
+
+
+class _StringHeap:
+    def __init__(self):
+        self.ids = {None: 0}
+        self.heap = bytearray()
+        self.offsets = array('Q', [0, 0])
+
+    def id(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.offsets) - 1
+            self.heap += value.encode('utf-8')
+            self.offsets.append(len(self.heap))
+        return string_id
+
+
+def write_snapshot(path, restaurants):
+    """
+    Writes restaurants and their menu items as one binary snapshot: fixed-width restaurant records sorted
+    by place_id, one fixed-width column per menu item field, and a heap holding each distinct string once.
+    The file is written aside and moved into place, so readers never see half a snapshot.
+    :param path: str
+    :param restaurants: iterable of storage.restaurant_record dicts
+    :return: dict with the restaurant, item and string counts
+    """
+    strings = _StringHeap()
+    columns = dict((name, array('I')) for name in STRING_COLUMNS)
+    columns.update((name, array('q')) for name in INT_COLUMNS)
+    records = []
+    for restaurant in restaurants:
+        first = len(columns['dish_name'])
+        for position, name, size, price, cals, items, image in restaurant['menu_items']:
+            columns['dish_name'].append(strings.id(name))
+            columns['dish_size'].append(strings.id(size))
+            columns['dish_items'].append(strings.id(items))
+            columns['image'].append(strings.id(image))
+            columns['price_cents'].append(MISSING if price is None else price)
+            columns['dish_cals'].append(MISSING if cals is None else cals)
+        values = [strings.id(restaurant.get(field)) for field in RESTAURANT_FIELDS]
+        values += [float('nan') if restaurant.get(field) is None else float(restaurant[field]) for field in NUMBER_FIELDS]
+        records.append((restaurant['place_id'], values + [first, len(columns['dish_name']) - first, 0]))
+    records.sort(key=lambda record: record[0])
+
+    item_count = len(columns['dish_name'])
+    blobs = [b''.join(RESTAURANT.pack(*values) for place_id, values in records)]
+    blobs += [columns[name].tobytes() for name in STRING_COLUMNS + INT_COLUMNS]
+    blobs += [strings.offsets.tobytes(), bytes(strings.heap)]
+    offsets = []
+    offset = HEADER.size
+    for blob in blobs:
+        offsets.append(offset)
+        offset = _aligned(offset + len(blob))
+
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), item_count, len(strings.offsets) - 1, *offsets))
+        for section, blob in zip(offsets, blobs):
+            f.seek(section)
+            f.write(blob)
+        f.truncate(offset)
+    os.replace(tmp, path)
+    return {'restaurants': len(records), 'items': item_count, 'strings': len(strings.offsets) - 1}
+
+
+def export_store(db_path, path, location=None):
+    """
+    Writes a snapshot of everything in a CrawlStore database, or of one location's restaurants.
+    The database is opened read-only, so it can be exported while a crawl is writing to it; one left at an
+    older schema version is refused rather than migrated, which is CrawlStore's job.
+    :param db_path: str
+    :param path: str, snapshot to write
+    :param location: str
+    :return: dict with the restaurant, item and string counts
+    """
+    conn = sqlite3.connect('file:{0}?mode=ro'.format(quote(os.path.abspath(db_path))), uri=True,
+                           isolation_level=None)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            raise ValueError('{0} has schema version {1}, {2} the {3} this code reads.{4}'.format(
+                db_path, version, 'older than' if version < SCHEMA_VERSION else 'newer than', SCHEMA_VERSION,
+                ' Open it with a CrawlStore to migrate it first.' if version < SCHEMA_VERSION else ''))
+        query = 'SELECT {0}, {1} FROM restaurants'.format(', '.join(RESTAURANT_FIELDS), ', '.join(NUMBER_FIELDS))
+        rows = conn.execute(query + (' WHERE location = ?' if location else ''), (location,) if location else ())
+
+        def restaurants():
+            for row in rows:
+                restaurant = dict(zip(RESTAURANT_FIELDS + NUMBER_FIELDS, row))
+                restaurant['menu_items'] = conn.execute(
+                    'SELECT position, dish_name, dish_size, price_cents, dish_cals, dish_items, image '
+                    'FROM menu_items WHERE place_id = ? ORDER BY position', (restaurant['place_id'],)).fetchall()
+                yield restaurant
+        return write_snapshot(path, restaurants())
+    finally:
+        conn.close()
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file through mmap. Opening one only reads its header; columns are
+    memoryviews over the mapping, and restaurants, menus and strings are decoded when first touched,
+    so memory use follows what is read rather than the size of the file.
+    """
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError('snapshots are little-endian and are read in place')
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self._map, 0)
+        if header[0] != MAGIC:
+            self.close()
+            raise ValueError('{0} is not a menu snapshot'.format(path))
+        self.restaurant_count, self.item_count, self.string_count = header[1:4]
+        self._sections = dict(zip(SECTIONS, header[4:]))
+        self._view = memoryview(self._map)
+        self.columns = {}
+        for name, typecode in [(name, 'I') for name in STRING_COLUMNS] + [(name, 'q') for name in INT_COLUMNS]:
+            self.columns[name] = self._cast(name, typecode, self.item_count)
+        self._string_offsets = self._cast('string_offsets', 'Q', self.string_count + 1)
+        self._heap = self._sections['heap']
+
+    def _cast(self, section, typecode, count):
+        start = self._sections[section]
+        return self._view[start:start + array(typecode).itemsize * count].cast(typecode)
+
+    def __len__(self):
+        return self.restaurant_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, string_id):
+        if not string_id:
+            return None
+        start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+        return str(self._view[self._heap + start:self._heap + end], 'utf-8')
+
+    def _record(self, index):
+        if not 0 <= index < self.restaurant_count:
+            raise IndexError(index)
+        return RESTAURANT.unpack_from(self._map, self._sections['restaurants'] + index * RESTAURANT.size)
+
+    def restaurant(self, index):
+        """
+        :param index: int, position in place_id order
+        :return: dict of the restaurant's fields plus 'first_item' and 'item_count'
+        """
+        values = self._record(index)
+        restaurant = dict((field, self.string(string_id)) for field, string_id in zip(RESTAURANT_FIELDS, values))
+        for field, value in zip(NUMBER_FIELDS, values[8:11]):
+            restaurant[field] = None if value != value else value
+        restaurant['first_item'], restaurant['item_count'] = values[11], values[12]
+        return restaurant
+
+    def place_id(self, index):
+        return self.string(self._record(index)[0])
+
+    def find(self, place_id):
+        """
+        Binary search over the place_id-sorted records, decoding only the ids it compares.
+        :param place_id: str
+        :return: int index, or None
+        """
+        index = bisect_left(_PlaceIds(self), place_id)
+        if index < self.restaurant_count and self.place_id(index) == place_id:
+            return index
+        return None
+
+    def item(self, row):
+        columns = self.columns
+        price, cals = columns['price_cents'][row], columns['dish_cals'][row]
+        return MenuItem(dish_name=self.string(columns['dish_name'][row]),
+                        dish_size=self.string(columns['dish_size'][row]),
+                        dish_price=None if price == MISSING else price,
+                        dish_cals=None if cals == MISSING else cals,
+                        dish_items=self.string(columns['dish_items'][row]),
+                        image=self.string(columns['image'][row]))
+
+    def menu(self, index):
+        """
+        :param index: int
+        :return: list of MenuItem for the restaurant at index
+        """
+        values = self._record(index)
+        return [self.item(row) for row in range(values[11], values[11] + values[12])]
+
+    def close(self):
+        """
+        Unmaps the file. Column memoryviews handed out earlier must have been dropped by then.
+        """
+        if self._map is not None:
+            for view in list(getattr(self, 'columns', {}).values()) + [getattr(self, '_string_offsets', None),
+                                                       getattr(self, '_view', None)]:
+                if view is not None:
+                    view.release()
+            self.columns = {}
+            self._string_offsets = self._view = None
+            self._map.close()
+            self._map = None
+            self._file.close()
+
+
+class _PlaceIds:
+    # Sequence of a snapshot's place_ids for bisect, decoded on access.
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __getitem__(self, index):
+        return self.snapshot.place_id(index)
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from menu import parse_cents, parse_count
+from text import dish_text
+
+# Stored in PRAGMA user_version. 1: menu_items holds price_cents and dish_cals as integers.
+SCHEMA_VERSION = 1
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS restaurants ('
+    'place_id TEXT PRIMARY KEY, name TEXT NOT NULL, location TEXT, address TEXT, website TEXT, maps_url TEXT, '
+    'lat REAL, lng REAL, rating REAL, menu_link TEXT, menu_source TEXT, '
+    'created_at REAL NOT NULL, updated_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS restaurants_location ON restaurants (location)',
+    'CREATE INDEX IF NOT EXISTS restaurants_name ON restaurants (name)',
+    'CREATE TABLE IF NOT EXISTS menu_items ('
+    'place_id TEXT NOT NULL REFERENCES restaurants (place_id) ON DELETE CASCADE, position INTEGER NOT NULL, '
+    'dish_name TEXT, dish_size TEXT, price_cents INTEGER, dish_cals INTEGER, dish_items TEXT, image TEXT, '
+    'PRIMARY KEY (place_id, position))',
+    'CREATE INDEX IF NOT EXISTS menu_items_dish_name ON menu_items (dish_name)',
+    'CREATE TABLE IF NOT EXISTS contacts ('
+    'place_id TEXT NOT NULL REFERENCES restaurants (place_id) ON DELETE CASCADE, kind TEXT NOT NULL, '
+    'value TEXT NOT NULL, PRIMARY KEY (place_id, kind, value))',
+    'CREATE INDEX IF NOT EXISTS contacts_value ON contacts (value)',
+    'CREATE TABLE IF NOT EXISTS hours ('
+    'place_id TEXT NOT NULL REFERENCES restaurants (place_id) ON DELETE CASCADE, day INTEGER NOT NULL, '
+    'open TEXT NOT NULL, close TEXT, PRIMARY KEY (place_id, day, open))',
+    'CREATE TABLE IF NOT EXISTS photos ('
+    'place_id TEXT NOT NULL REFERENCES restaurants (place_id) ON DELETE CASCADE, url TEXT NOT NULL, '
+    'caption TEXT, PRIMARY KEY (place_id, url))',
+    'CREATE TABLE IF NOT EXISTS menu_sources ('
+    'place_id TEXT PRIMARY KEY REFERENCES restaurants (place_id) ON DELETE CASCADE, url TEXT, '
+    'content_hash TEXT NOT NULL, checked_at REAL NOT NULL)',
+]
+
+UPSERT_RESTAURANT = (
+    'INSERT INTO restaurants VALUES (:place_id, :name, :location, :address, :website, :maps_url, :lat, :lng, '
+    ':rating, :menu_link, :menu_source, :now, :now) '
+    'ON CONFLICT (place_id) DO UPDATE SET name = excluded.name, location = excluded.location, '
+    'address = excluded.address, website = excluded.website, maps_url = excluded.maps_url, lat = excluded.lat, '
+    'lng = excluded.lng, rating = excluded.rating, menu_link = excluded.menu_link, '
+    'menu_source = excluded.menu_source, updated_at = excluded.updated_at')
+CHILD_TABLES = ('menu_items', 'contacts', 'hours', 'photos')
+
+
+def migrate(conn, path='database'):
+    """
+    Creates the schema, bringing a database written by an older CrawlStore up to SCHEMA_VERSION first.
+    :param conn: sqlite3.Connection in autocommit mode
+    :param path: str, named in the error for a database from a newer version
+    :return: int, the version the database was at
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise ValueError('{0} has schema version {1}, newer than the {2} this code reads.'.format(
+            path, version, SCHEMA_VERSION))
+    if version == SCHEMA_VERSION:
+        return version
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(menu_items)')]
+        if 'dish_price' in columns:
+            # Version 0 kept prices and calories as scraped text; parse them the way MenuItem does.
+            conn.create_function('parse_cents', 1, parse_cents)
+            conn.create_function('parse_count', 1, parse_count)
+            conn.execute('DROP INDEX IF EXISTS menu_items_dish_name')
+            conn.execute('ALTER TABLE menu_items RENAME TO menu_items_v0')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        if 'dish_price' in columns:
+            conn.execute('INSERT INTO menu_items SELECT place_id, position, dish_name, dish_size, '
+                         'parse_cents(dish_price), parse_count(dish_cals), dish_items, image FROM menu_items_v0')
+            conn.execute('DROP TABLE menu_items_v0')
+        conn.execute('PRAGMA user_version = {0}'.format(SCHEMA_VERSION))
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    return version
+
+_STOP = object()
+
+
+def _text(value):
+    if value is None:
+        return None
+    return dish_text(value).strip()
+
+
+def _attr(obj, name):
+    # googleplaces raises on detail attributes when get_details() was never called.
+    try:
+        return getattr(obj, name)
+    except Exception:
+        return None
+
+
+def restaurant_record(restaurant, location):
+    """
+    Snapshots a Restaurant into plain values, so a crawl worker can keep mutating it after handing it off.
+    :param restaurant: Restaurant
+    :param location: str
+    :return: dict
+    """
+    place = restaurant.api_response
+    geo = _attr(place, 'geo_location') or {}
+    rating = _attr(place, 'rating')
+    menu_link, menu_source = restaurant.menu_link if isinstance(restaurant.menu_link, tuple) else (restaurant.menu_link, None)
+    hours = []
+    for period in (restaurant.hours or {}).get('periods', []):
+        opens, closes = period.get('open') or {}, period.get('close') or {}
+        if 'day' in opens:
+            hours.append((opens['day'], opens.get('time', '0000'), closes.get('time')))
+    items = []
+    photos = []
+    for position, item in enumerate(restaurant.menu):
+        name = _text(item.dish_name)
+        items.append((position, name, _text(item.dish_size), item.dish_price, item.dish_cals,
+                      _text(item.dish_items), item.image))
+        if item.image:
+            photos.append((item.image, name))
+    return {
+        'place_id': restaurant.place_id,
+        'name': _text(restaurant.name),
+        'location': location,
+        'address': _attr(place, 'formatted_address'),
+        'website': restaurant.url,
+        'maps_url': _attr(place, 'url'),
+        'lat': float(geo['lat']) if 'lat' in geo else None,
+        'lng': float(geo['lng']) if 'lng' in geo else None,
+        'rating': float(rating) if rating not in (None, '') else None,
+        'menu_link': menu_link,
+        'menu_source': menu_source,
+        'menu_items': items,
+        'contacts': [('phone', p) for p in restaurant.phone_numbers if p] + [('email', e) for e in restaurant.emails if e],
+        'hours': hours,
+        'photos': photos,
+        'menu_url': restaurant.menu_url,
+        'menu_hash': restaurant.menu_hash,
+    }
+
+
+class CrawlStore:
+    """
+    SQLite database of crawled restaurants with their menu items, contacts, opening hours and photos.
+    Saves are queued and written by a single writer thread, in one transaction per batch of up to
+    `batch_size` restaurants or whatever arrived within `flush_interval` seconds, so crawl workers never
+    wait on disk. Restaurants are upserted by Google place_id: a re-crawl updates the row in place and
+    replaces its child rows.
+    """
+    def __init__(self, path='trans_database.sqlite', batch_size=200, flush_interval=0.5, logger=None,
+                 lock_retries=10, lock_backoff=1.0):
+        self.path = path
+        self.lock_retries = lock_retries
+        self.lock_backoff = lock_backoff
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger
+        self.saved = 0
+        self.batches = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        migrate(self._conn, path)
+        self._writer = threading.Thread(target=self._run, name='store-writer', daemon=True)
+        self._writer.start()
+
+    def save_restaurant(self, restaurant, location):
+        """
+        Queues a Restaurant for writing and returns immediately.
+        :param restaurant: Restaurant
+        :param location: str
+        :return: None
+        """
+        self._queue.put(restaurant_record(restaurant, location))
+
+    def flush(self):
+        """
+        Blocks until everything queued so far is committed.
+        """
+        self._queue.join()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        while True:
+            batch = self._next_batch()
+            records = [record for record in batch if record is not _STOP]
+            try:
+                if records:
+                    self._commit(conn, records)
+                    self.batches += 1
+            except Exception:
+                # Retry one by one so a single bad record doesn't lose the rest of its batch, and so
+                # the writer lives on to drain the queue, or flush() and close() would never return.
+                for record in records:
+                    try:
+                        self._commit(conn, [record])
+                    except Exception as e:
+                        self.failed += 1
+                        if self.logger is not None:
+                            self.logger.log(msg='Failed to store {0}: {1}'.format(record.get('place_id'), e),
+                                            level=logging.WARNING)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(records) < len(batch):
+                conn.close()
+                return
+
+    def _commit(self, conn, records):
+        # Other processes' stores and checkpoints write to the same file; when one of them holds the lock
+        # past the busy timeout, wait and try again rather than drop the batch.
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return self._commit_once(conn, records)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e) or attempt == self.lock_retries:
+                    raise
+                if self.logger is not None:
+                    self.logger.log(msg='Database locked, retrying {0} records: {1}'.format(len(records), e),
+                                    level=logging.WARNING)
+                time.sleep(self.lock_backoff * 2 ** attempt)
+
+    def _commit_once(self, conn, records):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for record in records:
+                self._write(conn, record)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self.saved += len(records)
+
+    @staticmethod
+    def _write(conn, record):
+        place_id = record['place_id']
+        conn.execute(UPSERT_RESTAURANT, dict(record, now=time.time()))
+        for table in CHILD_TABLES:
+            conn.execute('DELETE FROM {0} WHERE place_id = ?'.format(table), (place_id,))
+        conn.executemany('INSERT OR REPLACE INTO menu_items VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         [(place_id,) + item for item in record['menu_items']])
+        conn.executemany('INSERT OR IGNORE INTO contacts VALUES (?, ?, ?)',
+                         [(place_id,) + contact for contact in record['contacts']])
+        conn.executemany('INSERT OR IGNORE INTO hours VALUES (?, ?, ?, ?)',
+                         [(place_id,) + period for period in record['hours']])
+        conn.executemany('INSERT OR IGNORE INTO photos VALUES (?, ?, ?)',
+                         [(place_id,) + photo for photo in record['photos']])
+        if record['menu_hash'] is not None:
+            conn.execute('INSERT OR REPLACE INTO menu_sources VALUES (?, ?, ?, ?)',
+                         (place_id, record['menu_url'], record['menu_hash'], time.time()))
+        else:
+            conn.execute('DELETE FROM menu_sources WHERE place_id = ?', (place_id,))
+
+    def restaurant(self, place_id):
+        """
+        :param place_id: str
+        :return: dict of the restaurant's columns plus its menu_items, or None if it was never stored
+        """
+        with self._lock:
+            cursor = self._conn.execute('SELECT * FROM restaurants WHERE place_id = ?', (place_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            result = dict(zip([c[0] for c in cursor.description], row))
+            cursor = self._conn.execute('SELECT * FROM menu_items WHERE place_id = ? ORDER BY position', (place_id,))
+            columns = [c[0] for c in cursor.description]
+            result['menu_items'] = [dict(zip(columns, item)) for item in cursor.fetchall()]
+        return result
+
+    def menu_source(self, place_id):
+        """
+        What the last crawl knew about a restaurant's menu, for an incremental re-crawl.
+        :param place_id: str
+        :return: dict with menu_link, menu_source and the content_hash of the page its menu was parsed from,
+                 or None if no menu page was ever hashed for it
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT r.menu_link, r.menu_source, s.content_hash FROM menu_sources s '
+                'JOIN restaurants r USING (place_id) WHERE s.place_id = ?', (place_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('menu_link', 'menu_source', 'content_hash'), row))
+
+    def stats(self):
+        with self._lock:
+            counts = dict((table, self._conn.execute('SELECT COUNT(*) FROM {0}'.format(table)).fetchone()[0])
+                          for table in ('restaurants',) + CHILD_TABLES)
+        counts.update({'saved': self.saved, 'batches': self.batches, 'failed': self.failed,
+                       'queued': self._queue.qsize()})
+        return counts
+
+    def close(self):
+        """
+        Writes everything still queued, then stops the writer thread.
+        """
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
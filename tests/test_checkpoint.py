@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+from checkpoint import CrawlCheckpoint
+from menu import MenuItem
+
+
+def restaurant(place_id='p1'):
+    return SimpleNamespace(place_id=place_id, menu_link=None, phone_numbers=[], emails=[], menu_url=None,
+                           menu_hash=None, menu=[], stages=set())
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'crawl.sqlite'))
+    yield checkpoint
+    checkpoint.close()
+
+
+def test_cursor_follows_finished_pages(checkpoint):
+    assert checkpoint.cursor('A') == (0, None)
+    checkpoint.page_done('A', 0, 'token-1')
+    checkpoint.page_done('A', 1, 'token-2')
+    assert checkpoint.cursor('A') == (2, 'token-2')
+    checkpoint.stage_done('A', restaurant(), 'menu')
+    checkpoint.page_done('A', 2, None)
+    assert checkpoint.cursor('A') == (0, None)
+    assert checkpoint.stats()['places'] == 0
+
+
+def test_resume_restores_the_state_after_the_last_stage(checkpoint):
+    crawled = restaurant()
+    crawled.menu_link = ('https://mooo.example/menu', 'custom')
+    crawled.phone_numbers = ['(417) 555-0123']
+    crawled.menu_url, crawled.menu_hash = 'https://mooo.example/menu', 'abc'
+    crawled.menu = [MenuItem('Soup', None, '$4.50', None, None, 'https://img/1.jpg')]
+    checkpoint.stage_done('A', crawled, 'menu')
+    checkpoint.stage_done('A', crawled, 'pictures')
+
+    fresh = restaurant()
+    assert checkpoint.resume('A', fresh) == {'menu', 'pictures'}
+    assert fresh.stages == {'menu', 'pictures'}
+    assert fresh.menu_link == ('https://mooo.example/menu', 'custom')
+    assert (fresh.phone_numbers, fresh.menu_hash) == (['(417) 555-0123'], 'abc')
+    assert [(i.dish_name, i.dish_price, i.image) for i in fresh.menu] == [('Soup', 450, 'https://img/1.jpg')]
+    assert checkpoint.stats()['resumed'] == 1
+
+
+def test_resume_without_a_checkpoint_leaves_the_restaurant_alone(checkpoint):
+    fresh = restaurant()
+    checkpoint.stage_done('B', restaurant(), 'menu')
+    assert checkpoint.resume('A', fresh) == set()
+    assert fresh.menu == [] and checkpoint.stats()['resumed'] == 0
+
+
+def test_stored_restaurants_keep_no_state(checkpoint):
+    checkpoint.stage_done('A', restaurant(), 'stored')
+    assert checkpoint.stages('A', 'p1') == ({'stored'}, None)
+
+
+def test_clear(checkpoint):
+    for location in ('A', 'B'):
+        checkpoint.page_done(location, 0, 'token')
+        checkpoint.stage_done(location, restaurant(), 'menu')
+    checkpoint.clear('A')
+    assert checkpoint.cursor('A') == (0, None) and checkpoint.cursor('B') == (1, 'token')
+    checkpoint.clear()
+    assert checkpoint.stats() == {'locations': 0, 'places': 0, 'failed': 0, 'resumed': 0}
+
+
+def test_failed_places_outlive_the_cursor_until_the_last_page(checkpoint):
+    checkpoint.place_failed('A', 'p1', ValueError('no menu'))
+    checkpoint.place_failed('A', 'p2', ValueError('timeout'))
+    checkpoint.page_done('A', 0, 'token-1')
+    checkpoint.page_done('A', 1, 'token-2')
+    assert checkpoint.failed_places('A') == ['p1', 'p2'] and checkpoint.failed_places('B') == []
+    checkpoint.place_retried('A', 'p1')
+    assert checkpoint.failed_places('A') == ['p2']
+    checkpoint.page_done('A', 2, None)
+    assert checkpoint.failed_places('A') == [] and checkpoint.stats()['failed'] == 0
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from contacts import extract_contacts, merge, normalize_email, normalize_phone
+
+
+def test_extract_contacts_from_links_and_text():
+    page = ('<a href="tel:+1%20417-555-0123">Call</a> or (417) 555-0199. '
+            '<a href="mailto:Info@Example.com?subject=hi">Mail</a> orders@example.com <img src="logo@2x.png">')
+    phones, emails = extract_contacts(page)
+    assert phones == ['(417) 555-0123', '(417) 555-0199']
+    assert emails == ['info@example.com', 'orders@example.com']
+
+
+def test_extract_contacts_without_repeats_from_bytes():
+    page = '417.555.0123 and again 417-555-0123, write to a&#64;example.org'.encode('utf-8')
+    assert extract_contacts(page) == (['(417) 555-0123'], ['a@example.org'])
+
+
+def test_extract_contacts_ignores_numbers_inside_words():
+    assert extract_contacts('order id x4175550123y and 123-456-7890') == ([], [])
+
+
+def test_normalize():
+    assert normalize_phone('1 (417) 555 0123') == '(417) 555-0123'
+    assert normalize_phone('+44 20 7946 0018') == '+442079460018'
+    assert normalize_phone('555') is None
+    assert normalize_email(' Chef@Example.COM. ') == 'chef@example.com'
+    assert normalize_email('icon@2x.png') is None
+
+
+def test_merge_compares_normalized_values():
+    existing = ['417-555-0123']
+    assert merge(existing, ['(417) 555-0123', '(417) 555-0199'], normalize_phone) == \
+        ['417-555-0123', '(417) 555-0199']
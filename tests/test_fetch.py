@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fetch import Fetcher, close_fetcher, get_fetcher
+from http_cache import HttpCache
+
+BODY = b'<html>menu</html>' * 1000
+
+
+class MenuServer(ThreadingHTTPServer):
+    """
+    Serves BODY with ETag "v1", answering a matching If-None-Match with a 304. Every request is recorded.
+    """
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), MenuHandler)
+        self.cache_control = 'max-age=0'
+        self.requests = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}/menu'.format(self.server_address[1])
+
+
+class MenuHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Cache-Control', self.server.cache_control)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Cache-Control', self.server.cache_control)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = MenuServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / 'http_cache'))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def fetcher(cache):
+    fetcher = Fetcher(workers=2, cache=cache)
+    yield fetcher
+    fetcher.close()
+
+
+def test_a_stale_entry_is_revalidated_and_refreshed(server, cache, fetcher):
+    first = fetcher.get(server.url)
+    assert first.status_code == 200 and first.content == BODY
+    assert not cache.is_fresh(cache.lookup('GET', server.url))
+    server.cache_control = 'max-age=60'
+    second = fetcher.get(server.url)
+    assert second.status_code == 200 and second.content == BODY
+    assert server.requests == [None, '"v1"']
+    entry = cache.lookup('GET', server.url)
+    assert entry.headers['Cache-Control'] == 'max-age=60' and cache.is_fresh(entry)
+    assert cache.stats() == {'hits': 0, 'revalidated': 1, 'misses': 1, 'entries': 1}
+
+
+def test_a_fresh_entry_skips_the_network(server, cache, fetcher):
+    server.cache_control = 'max-age=60'
+    fetcher.get(server.url)
+    server.shutdown()
+    r = fetcher.get(server.url)
+    assert r.content == BODY and r.text.startswith('<html>')
+    assert server.requests == [None]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_use_cache_false_always_goes_to_the_network(server, cache, fetcher):
+    server.cache_control = 'max-age=60'
+    fetcher.get(server.url)
+    fetcher.get(server.url, use_cache=False)
+    assert server.requests == [None, None]
+
+
+def test_stream_feeds_the_cached_body_on_a_304(server, cache, fetcher):
+    fetcher.run(fetcher.astream(server.url, lambda chunk: False))
+    chunks = []
+    r = fetcher.run(fetcher.astream(server.url, lambda chunk: chunks.append(chunk), chunk_size=4096))
+    assert server.requests == [None, '"v1"']
+    assert r.complete and b''.join(chunks) == BODY and len(chunks[0]) == 4096
+    assert cache.revalidated == 1
+
+
+def test_stream_does_not_store_a_body_cut_short(server, cache, fetcher):
+    r = fetcher.run(fetcher.astream(server.url, lambda chunk: True, chunk_size=1024))
+    assert not r.complete and len(r.content) < len(BODY)
+    assert cache.lookup('GET', server.url) is None
+
+
+def test_the_shared_fetcher_refuses_different_settings(cache):
+    try:
+        shared = get_fetcher(per_host=2, cache=cache)
+        assert get_fetcher() is shared and get_fetcher(per_host=2, cache=cache) is shared
+        with pytest.raises(ValueError):
+            get_fetcher(per_host=4, cache=cache)
+    finally:
+        close_fetcher()
+    assert get_fetcher(per_host=4) is not shared
+    close_fetcher()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import time
+from email.utils import formatdate
+
+import pytest
+
+from http_cache import CacheEntry, HttpCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / 'http_cache'), host_ttls={'www.allmenus.com': 3600}, default_ttl=5)
+    yield cache
+    cache.close()
+
+
+def entry(headers, url='https://example.com/menu', stored_at=1000000.0):
+    return CacheEntry('GET ' + url, url, 200, headers, 'digest', stored_at)
+
+
+@pytest.mark.parametrize('headers, lifetime', [
+    ({'Cache-Control': 'max-age=60'}, 60),
+    ({'Cache-Control': 'public, s-maxage=120, max-age=60'}, 120),
+    ({'Cache-Control': 'no-cache, max-age=60'}, 0),
+    ({'Cache-Control': 'max-age=soon'}, 0),
+    ({'Expires': formatdate(1000300.0, usegmt=True), 'Date': formatdate(1000000.0, usegmt=True)}, 300),
+    ({'Expires': formatdate(999000.0, usegmt=True)}, 0),
+    ({'Last-Modified': formatdate(990000.0, usegmt=True)}, 1000),
+    ({}, 5),
+])
+def test_freshness_lifetime(cache, headers, lifetime):
+    assert cache.freshness_lifetime(entry(headers)) == lifetime
+
+
+def test_host_ttl_overrides_headers(cache):
+    assert cache.freshness_lifetime(entry({'Cache-Control': 'no-cache'}, url='https://www.allmenus.com/x/')) == 3600
+
+
+def test_is_fresh(cache):
+    cached = entry({'Cache-Control': 'max-age=60'}, stored_at=time.time() - 30)
+    assert cache.is_fresh(cached)
+    assert not cache.is_fresh(cached, now=cached.stored_at + 60)
+
+
+def test_conditional_headers():
+    modified = formatdate(990000.0, usegmt=True)
+    assert HttpCache.conditional_headers(entry({'etag': '"v2"', 'Last-Modified': modified})) == \
+        {'If-None-Match': '"v2"', 'If-Modified-Since': modified}
+    assert HttpCache.conditional_headers(entry({'Cache-Control': 'max-age=60'})) == {}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import nick_code_final_final as crawler
+from fetch import Response
+
+KNOWN_LINK = 'https://www.allmenus.com/mo/springfield/1-mooo/menu/'
+NEW_LINK = 'https://mooo.example/menu'
+PAGE = b'<html>the same menu as last time</html>'
+
+
+def place():
+    return SimpleNamespace(place_id='p1', website='https://mooo.example', name='Mooo', details={},
+                           local_phone_number='(417) 555-0100', url='https://maps.google.com/?cid=1',
+                           get_details=lambda: None)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def get_menu_link_from_google(self, logger):
+        calls.append('discovery')
+        self.menu_link = NEW_LINK, 'custom'
+
+    monkeypatch.setattr(crawler.Restaurant, 'get_menu_link_from_google', get_menu_link_from_google)
+    monkeypatch.setattr(crawler, 'find_yelp_photo_link', lambda *args: calls.append('pictures'))
+    return calls
+
+
+def gather(known_source):
+    return crawler.gather_data_for_place(0, place(), logging.getLogger(__name__), 'Springfield, MO', browser=None,
+                                         fetcher=object(), enrich=False, known_source=known_source)
+
+
+def known_source(content_hash):
+    return {'menu_link': KNOWN_LINK, 'menu_source': 'allmenus', 'content_hash': content_hash}
+
+
+def test_an_unchanged_menu_page_skips_the_restaurant(monkeypatch, calls):
+    def scrape_menu(self):
+        calls.append(self.menu_link[0])
+        if not self.menu_source_unchanged(Response(self.menu_link[0], 200, {}, PAGE)):
+            self.add_dishes([{'dish_name': 'Burger', 'dish_size': None, 'dish_price': '$9', 'dish_cals': None,
+                              'dish_items': None}])
+
+    monkeypatch.setattr(crawler.Restaurant, 'scrape_menu', scrape_menu)
+    r = gather(known_source(hashlib.sha256(PAGE).hexdigest()))
+    assert r.unchanged and r.menu == []
+    assert calls == [KNOWN_LINK]
+
+
+def test_a_known_link_that_raises_falls_back_to_discovery(monkeypatch, calls):
+    def scrape_menu(self):
+        calls.append(self.menu_link[0])
+        if self.menu_link[0] == KNOWN_LINK:
+            self.add_dishes([{'dish_name': 'Half parsed', 'dish_size': None, 'dish_price': None, 'dish_cals': None,
+                              'dish_items': None}])
+            raise IndexError('list index out of range')
+        self.add_dishes([{'dish_name': 'Burger', 'dish_size': None, 'dish_price': '$9', 'dish_cals': None,
+                          'dish_items': None}])
+
+    monkeypatch.setattr(crawler.Restaurant, 'scrape_menu', scrape_menu)
+    r = gather(known_source('an older hash'))
+    assert not r.unchanged and r.menu_link == (NEW_LINK, 'custom')
+    assert [item.dish_name for item in r.menu] == ['Burger']
+    assert calls == [KNOWN_LINK, 'discovery', NEW_LINK, 'pictures']
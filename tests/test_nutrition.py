@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+import nutrition
+from fetch import Response
+from nutrition import NutritionCache, NutritionClient
+
+
+class Clock:
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(nutrition, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'nutrition.sqlite')
+
+
+def test_entries_expire_after_the_ttl(clock, path):
+    cache = NutritionCache(path, ttl=60)
+    cache.set('Cheese Burger!', '540')
+    assert cache.get('cheese  burger') == '540' and 'CHEESE BURGER' in cache
+    clock.now += 60
+    assert cache.get('cheese burger') is None and 'cheese burger' not in cache
+    assert len(cache) == 1
+    cache.evict()
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_the_least_recently_used_entries_are_evicted(clock, path):
+    cache = NutritionCache(path, max_entries=2, touch_interval=0)
+    for name in ('soup', 'salad', 'wings'):
+        cache.set(name, '100')
+        clock.now += 1
+    assert cache.get('soup') == '100'
+    clock.now += 1
+    cache.evict()
+    assert len(cache) == 2 and 'soup' in cache and 'wings' in cache and 'salad' not in cache
+    cache.close()
+
+
+def test_access_times_are_only_refreshed_past_the_touch_interval(clock, path):
+    cache = NutritionCache(path, max_entries=1, touch_interval=3600)
+    cache.set('soup', '100')
+    clock.now += 1
+    cache.set('salad', '100')
+    cache.get('soup')
+    cache.evict()
+    assert 'salad' in cache and 'soup' not in cache
+    cache.close()
+
+
+def test_hit_and_miss_counters(clock, path):
+    first = NutritionCache(path)
+    first.set('soup', '100')
+    first.get('soup')
+    first.get('soup')
+    first.get('wings')
+    second = NutritionCache(path)
+    second.get('soup')
+    assert second.stats() == {'hits': 1, 'misses': 0, 'hit_rate': 1.0, 'total_hits': 1, 'total_misses': 0,
+                              'entries': 1}
+    stats = first.stats()
+    assert (stats['hits'], stats['misses'], stats['total_hits'], stats['total_misses']) == (2, 1, 3, 1)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+    first.close()
+    second.close()
+
+
+TOKEN_PAGE = '<html><head><meta name="csrf-token" content="{0}"></head></html>'
+SEARCH_PAGE = '<ul class="food_search_results"><li><a href="/food/calories/burger-1">Burger</a></li></ul>'
+DETAIL_PAGE = ('<table id="nutrition-facts"><tr><td class="col-1">Calories</td>'
+               '<td class="col-2"> 540 </td></tr></table>')
+
+
+class FakeMyFitnessPal:
+    """
+    Hands out tokens token-1, token-2, ... and rejects searches carrying anything but the latest one with
+    `rejection`: a status code, or 'login' for a redirect to the login page.
+    """
+    def __init__(self, rejection=422):
+        self.rejection = rejection
+        self.tokens = 0
+        self.searches = []
+
+    def get(self, url, use_cache=True):
+        if url.endswith('/food/calorie-chart-nutrition-facts'):
+            self.tokens += 1
+            return Response(url, 200, {}, TOKEN_PAGE.format('token-{0}'.format(self.tokens)).encode('utf-8'))
+        return Response(url, 200, {}, DETAIL_PAGE.encode('utf-8'))
+
+    def post(self, url, data=None):
+        self.searches.append((data['search'], data['authenticity_token']))
+        if data['authenticity_token'] != 'token-{0}'.format(self.tokens):
+            if self.rejection == 'login':
+                return Response(nutrition.MFP_URL + '/account/login', 200, {}, b'<html>log in</html>')
+            return Response(url, self.rejection, {}, b'')
+        return Response(url, 200, {}, SEARCH_PAGE.encode('utf-8'))
+
+
+def test_searches_use_the_name_as_written_and_cache_the_normalized_one(clock, path):
+    site = FakeMyFitnessPal()
+    cache = NutritionCache(path)
+    client = NutritionClient(site, cache=cache)
+    assert client.lookup("Nick's  Cheese-Burger") == '540'
+    assert site.searches == [("Nick's Cheese-Burger", 'token-1')]
+    assert cache.get('nick s cheese burger') == '540'
+    assert client.lookup('NICK S CHEESE BURGER') == '540' and len(site.searches) == 1
+    cache.close()
+
+
+@pytest.mark.parametrize('rejection', [401, 403, 422, 'login'])
+def test_a_rejected_token_is_refreshed_once_and_the_search_retried(rejection):
+    site = FakeMyFitnessPal(rejection)
+    client = NutritionClient(site)
+    assert client.lookup('burger') == '540'
+    site.tokens += 1  # the session expired, and with it token-1
+    assert client.lookup('fries') == '540'
+    assert site.searches == [('burger', 'token-1'), ('fries', 'token-1'), ('fries', 'token-3')]
+    assert client.token_refreshes == 2
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from difflib import SequenceMatcher
+
+from menu import MenuItem
+from photo_matching import PhotoMatcher, assign_pictures
+
+# By cosine score 'wings chicken' is the closest caption to 'chicken wings', by SequenceMatcher the furthest.
+CAPTIONS = ['wings chicken', 'chicken wing', 'chicken wings platter']
+
+
+def matcher(captions=CAPTIONS, **kwargs):
+    return PhotoMatcher([(caption, caption + '.jpg') for caption in captions], **kwargs)
+
+
+def test_the_best_ratio_among_the_candidates_wins():
+    m = matcher(threshold=0.5)
+    scores = m.scores(['chicken wings'])[0]
+    ratios = [SequenceMatcher(None, 'chicken wings', caption).ratio() for caption in CAPTIONS]
+    assert scores.argmax() == 0 and ratios[0] >= 0.5
+    assert max(range(3), key=ratios.__getitem__) == 1
+    assert m.match(['chicken wings']) == [1]
+
+
+def test_each_photo_goes_to_one_dish_in_menu_order():
+    assert matcher(threshold=0.5).match(['chicken wings', 'chicken wings', 'chicken wings', 'chicken wings']) == \
+        [1, 2, 0, None]
+
+
+def test_no_candidate_passing_the_threshold_means_no_match():
+    assert matcher(threshold=0.97).match(['chicken wings']) == [None]
+    assert matcher().match(['zzz']) == [None]
+
+
+def test_only_the_top_candidates_are_compared():
+    # With a single candidate only the best cosine score is compared, and its ratio is too low.
+    assert matcher(threshold=0.6, candidates=1).match(['chicken wings']) == [None]
+    assert matcher(threshold=0.6, candidates=2).match(['chicken wings']) == [1]
+
+
+def test_no_pictures_or_no_dishes():
+    assert matcher([]).match(['chicken wings']) == [None]
+    assert matcher().match([]) == []
+
+
+def test_assign_pictures_sets_images_and_returns_the_rest():
+    menu = [MenuItem('Chicken Wings', None, '$9', None, None), MenuItem('Soup', None, '$4', None, None)]
+    pictures = [(caption, caption + '.jpg') for caption in CAPTIONS]
+    unmatched = assign_pictures(menu, pictures, threshold=0.6)
+    assert [item.image for item in menu] == ['chicken wing.jpg', None]
+    assert unmatched == [pictures[0], pictures[2]]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from googleplaces import GooglePlacesError
+
+from pipeline import PlacesPipeline, places_pages
+
+
+def results(names, next_page_token=None):
+    return SimpleNamespace(places=[SimpleNamespace(name=name, place_id=name) for name in names],
+                           has_next_page_token=next_page_token is not None, next_page_token=next_page_token)
+
+
+PAGES = [(0, results(['a', 'b', 'c'], 't1')), (1, results(['d', 'e'], 't2')), (2, results(['f'])),
+         (3, results([]))]
+
+
+def run(pages, gather, **kwargs):
+    finished = []
+    pipeline = PlacesPipeline(pages, gather, lambda page, restaurants, token: finished.append(
+        (page, sorted(restaurants), token)), **kwargs)
+    thread = threading.Thread(target=lambda: finished.append(pipeline.run()), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), 'pipeline did not stop'
+    return finished[:-1], finished[-1]
+
+
+def test_pages_finish_in_order_and_the_pipeline_stops():
+    def gather(index, place):
+        # Early places are the slowest, so later pages are gathered first.
+        time.sleep(0.05 if place.name in 'abc' else 0)
+        return place.name
+
+    finished, stats = run(PAGES, gather, workers=3, maxsize=2)
+    assert finished == [(0, ['a', 'b', 'c'], 't1'), (1, ['d', 'e'], 't2'), (2, ['f'], None), (3, [], None)]
+    assert (stats['pages'], stats['places'], stats['restaurants'], stats['failed']) == (4, 6, 6, 0)
+    assert stats['max_depth'] <= 2
+
+
+def test_failed_places_are_left_out_of_their_page():
+    def gather(index, place):
+        if place.name == 'b':
+            raise ValueError('no menu')
+        return place.name
+
+    failures = []
+    finished, stats = run(PAGES, gather, workers=2,
+                          fail=lambda page, place, e: failures.append((page, place.place_id, str(e))))
+    assert finished[0] == (0, ['a', 'c'], 't1')
+    assert (stats['restaurants'], stats['failed']) == (5, 1)
+    assert failures == [(0, 'b', 'no menu')]
+
+
+def test_keep_filters_places():
+    finished, stats = run(PAGES, lambda index, place: place.name, keep=lambda place: place.name != 'd')
+    assert finished[1] == (1, ['e'], 't2') and stats['places'] == 5
+
+
+def test_a_paging_error_finishes_what_was_fetched():
+    def pages():
+        yield PAGES[0]
+        raise GooglePlacesError('OVER_QUERY_LIMIT')
+
+    finished, stats = run(pages(), lambda index, place: place.name)
+    assert finished == [(0, ['a', 'b', 'c'], 't1')]
+
+
+def test_finish_errors_stop_the_pipeline():
+    pipeline = PlacesPipeline(PAGES, lambda index, place: place.name, lambda *args: 1 / 0, workers=2)
+    with pytest.raises(ZeroDivisionError):
+        pipeline.run()
+
+
+class FakePlaces:
+    def __init__(self, not_ready=0, expired=()):
+        self.not_ready = not_ready
+        self.expired = set(expired)
+        self.calls = []
+
+    def text_search(self, query, location):
+        self.calls.append('search')
+        return results(['a'], 't1')
+
+    def nearby_search(self, pagetoken):
+        self.calls.append(pagetoken)
+        if pagetoken in self.expired:
+            raise GooglePlacesError('Request to URL failed: INVALID_REQUEST (token expired)')
+        if self.not_ready:
+            self.not_ready -= 1
+            raise GooglePlacesError('Request to URL failed: INVALID_REQUEST')
+        return results(['b'])
+
+
+def test_places_pages_retries_a_token_that_is_not_ready_yet():
+    api = FakePlaces(not_ready=2)
+    pages = list(places_pages(api, 'A', retry_delay=0.001))
+    assert [(page, [p.name for p in r.places]) for page, r in pages] == [(0, ['a']), (1, ['b'])]
+    assert api.calls == ['search', 't1', 't1', 't1']
+
+
+def test_places_pages_restarts_when_a_saved_token_expired():
+    api = FakePlaces(expired={'old'})
+    pages = list(places_pages(api, 'A', page=3, page_token='old', retries=2, retry_delay=0.001))
+    assert [page for page, r in pages] == [0, 1]
+    assert api.calls == ['old', 'old', 'search', 't1']
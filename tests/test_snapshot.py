@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from snapshot import Snapshot, export_store, write_snapshot
+from storage import CrawlStore
+
+RESTAURANTS = [
+    {'place_id': 'p2', 'name': 'Café Crème', 'location': 'Springfield, MO', 'lat': 37.2, 'lng': -93.3,
+     'rating': None, 'menu_link': 'https://cafe.example/menu', 'menu_source': 'custom',
+     'menu_items': [(0, 'Crêpe', None, 650, 320, 'butter, sugar', None),
+                    (1, 'Soup', 'large', None, None, None, 'https://img.example/soup.jpg')]},
+    {'place_id': 'p1', 'name': 'Mooo', 'location': 'Springfield, MO', 'lat': None, 'lng': None, 'rating': 4.5,
+     'menu_items': [(0, 'Soup', None, 450, 120, None, None)]},
+    {'place_id': 'p3', 'name': 'Empty', 'menu_items': []},
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / 'crawl.snap')
+    assert write_snapshot(path, RESTAURANTS)['items'] == 3
+    with Snapshot(path) as snapshot:
+        yield snapshot
+
+
+def test_restaurants_are_sorted_and_found_by_place_id(snapshot):
+    assert len(snapshot) == 3
+    assert [snapshot.place_id(i) for i in range(3)] == ['p1', 'p2', 'p3']
+    assert snapshot.find('p2') == 1
+    assert snapshot.find('p0') is None and snapshot.find('p9') is None
+
+
+def test_round_trip(snapshot):
+    cafe = snapshot.restaurant(snapshot.find('p2'))
+    assert (cafe['name'], cafe['lat'], cafe['rating'], cafe['menu_source'], cafe['address']) == \
+        ('Café Crème', 37.2, None, 'custom', None)
+    menu = snapshot.menu(snapshot.find('p2'))
+    assert [(i.dish_name, i.dish_size, i.dish_price, i.dish_cals, i.dish_items, i.image) for i in menu] == \
+        [('Crêpe', None, 650, 320, 'butter, sugar', None), ('Soup', 'large', None, None, None,
+                                                          'https://img.example/soup.jpg')]
+    assert snapshot.menu(snapshot.find('p3')) == []
+    assert list(snapshot.columns['price_cents']) == [650, -1, 450]
+
+
+def test_close_releases_the_mapping(tmp_path):
+    path = str(tmp_path / 'crawl.snap')
+    write_snapshot(path, RESTAURANTS)
+    snapshot = Snapshot(path)
+    column = snapshot.columns['dish_name']
+    snapshot.close()
+    snapshot.close()
+    assert snapshot.columns == {}
+    with pytest.raises(ValueError):
+        len(column)
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'crawl.sqlite'
+    path.write_bytes(b'SQLite format 3\x00' + bytes(200))
+    with pytest.raises(ValueError, match='not a menu snapshot'):
+        Snapshot(str(path))
+
+
+def test_export_store_by_location(tmp_path):
+    db = str(tmp_path / 'crawl.sqlite')
+    with CrawlStore(db):
+        pass
+    assert export_store(db, str(tmp_path / 'empty.snap'), location='Nowhere')['restaurants'] == 0
+    with Snapshot(str(tmp_path / 'empty.snap')) as snapshot:
+        assert len(snapshot) == 0 and snapshot.find('p1') is None
+
+
+def test_export_store_refuses_an_unmigrated_database(tmp_path):
+    db = str(tmp_path / 'old.sqlite')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE restaurants (place_id TEXT PRIMARY KEY)')
+    conn.close()
+    with pytest.raises(ValueError, match='older than'):
+        export_store(db, str(tmp_path / 'old.snap'))
+    conn = sqlite3.connect(db)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'menu_items'").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from menu import MenuItem
+from storage import SCHEMA_VERSION, CrawlStore, migrate
+
+
+def restaurant(place_id='p1', name='Mooo', menu=(), phones=('(417) 555-0123',), menu_hash=None):
+    place = SimpleNamespace(geo_location={'lat': 37.2, 'lng': -93.3}, rating='4.5', formatted_address='1 Main St',
+                            url='https://maps.example/p1')
+    return SimpleNamespace(api_response=place, place_id=place_id, name=name, url='https://mooo.example',
+                           menu_link=('https://mooo.example/menu', 'custom'), menu=list(menu),
+                           hours={'periods': [{'open': {'day': 1, 'time': '1100'}, 'close': {'time': '2200'}}]},
+                           phone_numbers=list(phones), emails=[], menu_url='https://mooo.example/menu',
+                           menu_hash=menu_hash)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CrawlStore(str(tmp_path / 'crawl.sqlite'), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_save_and_read_back(store):
+    store.save_restaurant(restaurant(menu=[MenuItem('Soup', None, '$4.50', '120', None, 'https://img/1.jpg')],
+                                     menu_hash='abc'), 'Springfield, MO')
+    store.flush()
+    stored = store.restaurant('p1')
+    assert (stored['name'], stored['location'], stored['rating'], stored['menu_source']) == \
+        ('Mooo', 'Springfield, MO', 4.5, 'custom')
+    assert [(i['dish_name'], i['price_cents'], i['dish_cals'], i['image']) for i in stored['menu_items']] == \
+        [('Soup', 450, 120, 'https://img/1.jpg')]
+    assert store.menu_source('p1') == {'menu_link': 'https://mooo.example/menu', 'menu_source': 'custom',
+                                       'content_hash': 'abc'}
+    assert store.stats()['contacts'] == 1 and store.stats()['hours'] == 1 and store.stats()['photos'] == 1
+
+
+def test_recrawl_upserts_and_replaces_child_rows(store):
+    store.save_restaurant(restaurant(menu=[MenuItem('Soup', None, '4', None, None)] * 3, menu_hash='abc'), 'A')
+    store.flush()
+    store.save_restaurant(restaurant(name='Mooo Burgers', menu=[MenuItem('Burger', None, '9', None, None)]), 'A')
+    store.flush()
+    stored = store.restaurant('p1')
+    assert stored['name'] == 'Mooo Burgers'
+    assert [i['dish_name'] for i in stored['menu_items']] == ['Burger']
+    assert store.menu_source('p1') is None
+    assert store.stats()['restaurants'] == 1
+
+
+def test_bad_record_is_counted_and_the_writer_keeps_going(store):
+    store._queue.put({'place_id': 'broken'})
+    store.save_restaurant(restaurant(place_id='p2'), 'A')
+    store.flush()
+    stats = store.stats()
+    assert (stats['failed'], stats['saved'], stats['restaurants']) == (1, 1, 1)
+
+
+OLD_MENU_ITEMS = ('CREATE TABLE menu_items (place_id TEXT NOT NULL, position INTEGER NOT NULL, dish_name TEXT, '
+                  'dish_size TEXT, dish_price TEXT, dish_cals TEXT, dish_items TEXT, image TEXT, '
+                  'PRIMARY KEY (place_id, position))')
+
+
+def test_version_0_database_is_migrated(tmp_path):
+    path = str(tmp_path / 'old.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute(OLD_MENU_ITEMS)
+    conn.execute("INSERT INTO menu_items VALUES ('p1', 0, 'Soup', NULL, '$1,204.5', '1,200', NULL, NULL)")
+    conn.commit()
+    conn.close()
+    with CrawlStore(path) as store:
+        store.save_restaurant(restaurant(place_id='p2', menu=[MenuItem('Pie', None, '$3', None, None)]), 'A')
+        store.flush()
+        assert store.stats()['failed'] == 0
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute('SELECT place_id, price_cents, dish_cals FROM menu_items ORDER BY place_id').fetchall() == \
+        [('p1', 120450, 1200), ('p2', 300, None)]
+    conn.close()
+
+
+def test_newer_database_is_refused(tmp_path):
+    path = str(tmp_path / 'new.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA user_version = {0}'.format(SCHEMA_VERSION + 1))
+    conn.close()
+    with pytest.raises(ValueError, match='newer'):
+        migrate(sqlite3.connect(path, isolation_level=None), path)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from checkpoint import STAGES
+from work_queue import LeaseLost, RemoteWorkQueue, TaskCheckpoint, WorkQueue, WorkQueueError, serve
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), visibility_timeout=0.2, max_attempts=2, retry_delay=0.2)
+    yield queue
+    queue.close()
+
+
+def test_put_is_idempotent_per_location(queue):
+    assert queue.put('A', 'p1') and queue.put('B', 'p1')
+    assert not queue.put('A', 'p1')
+    assert queue.stats() == {'ready': 2}
+
+
+def test_a_leased_task_goes_to_one_worker_until_its_lease_expires(queue):
+    queue.put('A', 'p1')
+    task, = queue.lease('w1', 5)
+    assert (task.stages, task.attempts) == (list(STAGES), 1)
+    assert queue.lease('w2') == []
+    time.sleep(0.25)
+    assert queue.stats() == {'expired': 1}
+    again, = queue.lease('w2')
+    assert again.attempts == 2 and again.lease != task.lease
+    with pytest.raises(LeaseLost):
+        queue.update(task, ['pictures'])
+    with pytest.raises(LeaseLost):
+        queue.heartbeat(task)
+
+
+def test_update_resumes_the_next_worker_at_the_pending_stages(queue):
+    queue.put('A', 'p1')
+    task, = queue.lease('w1')
+    queue.update(task, ['calories', 'stored'], {'menu_link': 'x'})
+    time.sleep(0.25)
+    again, = queue.lease('w2')
+    assert (again.stages, again.state) == (['calories', 'stored'], {'menu_link': 'x'})
+    queue.update(again, [])
+    assert queue.stats() == {'done': 1}
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.put('A', 'p1')
+    task, = queue.lease('w1')
+    for _ in range(3):
+        time.sleep(0.1)
+        queue.heartbeat(task)
+    assert queue.lease('w2') == []
+
+
+def test_failed_tasks_back_off_then_go_dead(queue):
+    queue.put('A', 'p1')
+    task, = queue.lease('w1')
+    queue.fail(task, 'timeout')
+    assert queue.lease('w1') == []
+    time.sleep(0.25)
+    task, = queue.lease('w1')
+    queue.fail(task, 'timeout')
+    time.sleep(0.25)
+    assert queue.lease('w1') == [] and queue.stats() == {'dead': 1}
+
+
+def test_tasks_whose_workers_keep_dying_go_dead(queue):
+    queue.put('A', 'p1')
+    for _ in range(2):
+        assert len(queue.lease('w1')) == 1
+        time.sleep(0.25)
+    assert queue.lease('w1') == [] and queue.stats() == {'dead': 1}
+
+
+def test_task_checkpoint_heartbeats_tasks_in_flight(queue):
+    queue.retry_delay = 10
+    for place_id in ('p1', 'p2'):
+        queue.put('A', place_id)
+    tasks = queue.lease('w1', 2)
+    with TaskCheckpoint(queue, tasks, heartbeat=0.05) as checkpoint:
+        checkpoint.fail(tasks[0], 'no menu')
+        restaurant = SimpleNamespace(place_id=tasks[1].place_id, stages=set())
+        checkpoint.stage_done('A', restaurant, 'stored')
+        queue.put('A', 'p3')
+        time.sleep(0.3)
+        assert [task.place_id for task in queue.lease('w2', 3)] == ['p3']
+    assert checkpoint.lost == 0
+    assert queue.stats() == {'ready': 1, 'done': 1, 'leased': 1}
+
+
+@pytest.fixture
+def remote(queue):
+    server = serve(queue, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield RemoteWorkQueue('http://127.0.0.1:{0}'.format(server.server_address[1]), timeout=5)
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_queue(remote):
+    assert remote.put('A', 'p1')
+    task, = remote.lease('w1')
+    remote.update(task, ['stored'], {'menu_link': None})
+    assert remote.stats() == {'leased': 1}
+    time.sleep(0.25)
+    remote.lease('w2')
+    with pytest.raises(LeaseLost):
+        remote.heartbeat(task)
+
+
+def test_remote_errors_come_back_as_responses(remote):
+    with pytest.raises(WorkQueueError, match='404'):
+        remote._call('drop_table')
+    with pytest.raises(WorkQueueError, match='400'):
+        remote._call('put', location='A')
+    assert remote.stats() == {}
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import nick_code_final_final as crawler
+from fetch import Fetcher, Response
+
+PHOTO_LINK = 'https://www.yelp.com/biz_photos/mooo-springfield'
+
+
+def listing_page(start):
+    anchors = ['<a data-analytics-label="biz-photo" href="/biz_photos/mooo?select=cover"></a>']
+    anchors += ['<a data-analytics-label="biz-photo" href="/biz_photos/mooo?select=p{0}">'
+                '<img alt="Dish number {0}" src="https://s3.yelp.example/p{0}.jpg"></a>'.format(start + i)
+                for i in range(30)]
+    return '<html><body>{0}</body></html>'.format(''.join(anchors)).encode('utf-8')
+
+
+@pytest.fixture
+def yelp(monkeypatch):
+    fetcher = Fetcher(workers=2)
+    fetched = []
+
+    async def aget(url, **kwargs):
+        fetched.append(url)
+        await asyncio.sleep(0.05)
+        return Response(url, 200, {}, listing_page(int(url.split('start=')[1].split('&')[0])))
+
+    fetcher.aget = aget
+    monkeypatch.setattr(crawler, 'find_yelp_photo_link', lambda *args: PHOTO_LINK)
+    yield SimpleNamespace(fetcher=fetcher, fetched=fetched)
+    fetcher.close()
+
+
+def pictures(yelp, limit):
+    return crawler.get_pictures_for_restaurant(0, SimpleNamespace(name='Mooo'), logging.getLogger(__name__),
+                                               'Springfield, MO', SimpleNamespace(fetcher=yelp.fetcher), limit=limit)
+
+
+def test_every_listing_page_is_read_without_a_limit(yelp):
+    assert len(pictures(yelp, None)) == 300
+    assert len(yelp.fetched) == 10
+
+
+def test_the_harvest_stops_once_enough_photos_are_in(yelp):
+    found = pictures(yelp, 40)
+    assert found[:2] == [('Dish number 0', 'https://s3.yelp.example/p0.jpg'),
+                         ('Dish number 1', 'https://s3.yelp.example/p1.jpg')]
+    assert len(found) == 40
+    time.sleep(0.3)
+    # The second page plus at most the prefetch of the third, never the remaining seven.
+    assert len(yelp.fetched) <= 3
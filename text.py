@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+
+def dish_text(dish_name):
+    """
+    Scrapers hand back dish names as str, bytes or a list of either; join them into one str.
+    :param dish_name: str, bytes or list
+    :return: str
+    """
+    if isinstance(dish_name, (list, tuple)):
+        return ' '.join(dish_text(part) for part in dish_name)
+    if isinstance(dish_name, bytes):
+        return dish_name.decode('utf-8', errors='replace')
+    return '' if dish_name is None else str(dish_name)
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+Durable queue of crawl work shared by any number of worker processes, on any number of machines.
+
+    python work_queue.py serve --path work_queue.sqlite --port 8765
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from checkpoint import STAGES, restaurant_state, restore_restaurant
+
+
+class WorkQueueError(Exception):
+    """
+    A queue server answered a call with an error.
+    """
+
+
+class LeaseLost(Exception):
+    """
+    The task's lease ran out and it may already be with another worker.
+    """
+
+
+class Task:
+    def __init__(self, id, location, place_id, stages, state, attempts, lease):
+        self.id = id
+        self.location = location
+        self.place_id = place_id
+        self.stages = stages
+        self.state = state
+        self.attempts = attempts
+        self.lease = lease
+
+    def __repr__(self):
+        return '<Task {0} {1} {2}>'.format(self.id, self.place_id, ','.join(self.stages))
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of restaurants to crawl, one task per (location, place_id) with the stages still
+    pending and the restaurant's state after the last finished one. lease() hands a ready task to one
+    worker for `visibility_timeout` seconds; finishing a stage extends the lease, so a slow but live
+    worker keeps it. When a lease runs out, the worker is presumed dead and the task goes to the next
+    lease() call, resuming at its first unfinished stage. A failed task is retried after an exponential
+    backoff, and parked as 'dead' after `max_attempts`.
+    """
+    def __init__(self, path='work_queue.sqlite', visibility_timeout=600, max_attempts=3, retry_delay=30):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS tasks ('
+                           'id INTEGER PRIMARY KEY, location TEXT NOT NULL, place_id TEXT NOT NULL, '
+                           "stages TEXT NOT NULL, state TEXT, status TEXT NOT NULL DEFAULT 'ready', "
+                           'attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, lease TEXT, '
+                           'worker TEXT, error TEXT, updated_at REAL NOT NULL, UNIQUE (location, place_id))')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, available_at)')
+
+    def put(self, location, place_id, stages=STAGES):
+        """
+        Adds a restaurant to crawl. A place_id already queued for the location is left as it is.
+        :param location: str
+        :param place_id: str
+        :param stages: sequence of str, the stages to run
+        :return: bool, True if the task is new
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO tasks (location, place_id, stages, available_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)', (location, place_id, ','.join(stages), now, now))
+        return cursor.rowcount == 1
+
+    def lease(self, worker, count=1):
+        """
+        Takes up to count tasks that are ready, or whose lease has expired.
+        :param worker: str, recorded with the lease for stats()
+        :param count: int
+        :return: list of Task
+        """
+        now = time.time()
+        tasks = []
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # A task whose workers keep dying with it is given up on like one that keeps failing.
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'dead', error = 'lease expired', updated_at = ? "
+                    "WHERE status = 'leased' AND available_at <= ? AND attempts >= ?", (now, now, self.max_attempts))
+                rows = self._conn.execute(
+                    "SELECT id, location, place_id, stages, state, attempts FROM tasks "
+                    "WHERE status IN ('ready', 'leased') AND available_at <= ? ORDER BY available_at LIMIT ?",
+                    (now, count)).fetchall()
+                for id, location, place_id, stages, state, attempts in rows:
+                    lease = uuid.uuid4().hex
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'leased', lease = ?, worker = ?, attempts = attempts + 1, "
+                        'available_at = ?, updated_at = ? WHERE id = ?',
+                        (lease, worker, now + self.visibility_timeout, now, id))
+                    tasks.append(Task(id, location, place_id, [s for s in stages.split(',') if s],
+                                      json.loads(state) if state else None, attempts + 1, lease))
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return tasks
+
+    def _update(self, task, assignments, args):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET {0}, updated_at = ? WHERE id = ? AND lease = ? AND status = 'leased'".format(
+                    assignments), tuple(args) + (time.time(), task.id, task.lease))
+        if cursor.rowcount != 1:
+            raise LeaseLost(task.place_id)
+
+    def update(self, task, stages, state=None):
+        """
+        Records the stages still pending after one finished, and extends the lease.
+        Once none are left the task is done.
+        :param task: Task
+        :param stages: list of str
+        :param state: dict, the restaurant's state for whichever worker picks the task up next
+        :return: None; raises LeaseLost if the task is no longer leased to this caller
+        """
+        self._update(task, 'stages = ?, state = ?, status = ?, available_at = ?',
+                     (','.join(stages), json.dumps(state) if state is not None else None,
+                      'leased' if stages else 'done', time.time() + self.visibility_timeout))
+        task.stages, task.state = list(stages), state
+
+    def heartbeat(self, task):
+        """
+        Extends the lease of a task taking longer than the visibility timeout.
+        """
+        self._update(task, 'available_at = ?', (time.time() + self.visibility_timeout,))
+
+    def fail(self, task, error):
+        """
+        Gives a task back to be retried after a backoff, or parks it as dead after max_attempts.
+        :param task: Task
+        :param error: str
+        """
+        if task.attempts >= self.max_attempts:
+            self._update(task, "status = 'dead', error = ?", (str(error),))
+        else:
+            delay = self.retry_delay * 2 ** (task.attempts - 1)
+            self._update(task, "status = 'ready', lease = NULL, error = ?, available_at = ?",
+                         (str(error), time.time() + delay))
+
+    def stats(self):
+        """
+        :return: dict of task counts by status, with expired leases counted as 'expired'
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CASE WHEN status = 'leased' AND available_at <= ? THEN 'expired' ELSE status END, COUNT(*) "
+                'FROM tasks GROUP BY 1', (now,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RemoteWorkQueue:
+    """
+    Client for a WorkQueue shared through serve(), with the same methods, so workers on other machines
+    don't need the SQLite file on a network filesystem, where its locking can't be trusted.
+    """
+    METHODS = ('put', 'lease', 'update', 'heartbeat', 'fail', 'stats')
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _call(self, method, **kwargs):
+        request = urllib.request.Request('{0}/{1}'.format(self.url, method), data=json.dumps(kwargs).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                result = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read().decode('utf-8'))['error']
+            except (ValueError, KeyError):
+                error = e.reason
+            raise WorkQueueError('{0} {1}: {2}'.format(method, e.code, error))
+        if 'lease_lost' in result:
+            raise LeaseLost(result['lease_lost'])
+        return result['result']
+
+    def put(self, location, place_id, stages=STAGES):
+        return self._call('put', location=location, place_id=place_id, stages=list(stages))
+
+    def lease(self, worker, count=1):
+        return [Task(**task) for task in self._call('lease', worker=worker, count=count)]
+
+    def update(self, task, stages, state=None):
+        self._call('update', task=task.to_dict(), stages=list(stages), state=state)
+        task.stages, task.state = list(stages), state
+
+    def heartbeat(self, task):
+        self._call('heartbeat', task=task.to_dict())
+
+    def fail(self, task, error):
+        self._call('fail', task=task.to_dict(), error=str(error))
+
+    def stats(self):
+        return self._call('stats')
+
+    def close(self):
+        pass
+
+
+def open_work_queue(target, **kwargs):
+    """
+    :param target: str, an http:// url of serve() or the path of a queue database
+    :return: WorkQueue or RemoteWorkQueue
+    """
+    if target.startswith(('http://', 'https://')):
+        return RemoteWorkQueue(target)
+    return WorkQueue(target, **kwargs)
+
+
+def serve(queue, host='127.0.0.1', port=8765):
+    """
+    Shares a WorkQueue over HTTP: each method is a POST to /<method> with its keyword arguments as JSON.
+    Errors come back as a JSON {'error': ...} with a 4xx or 5xx status. There is no authentication, so it
+    only listens on localhost unless given another host, which should be on a trusted network.
+    :param queue: WorkQueue
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            method = self.path.strip('/')
+            if method not in RemoteWorkQueue.METHODS:
+                self._reply(404, {'error': 'unknown method {0}'.format(method)})
+                return
+            try:
+                kwargs = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8') or '{}')
+                if 'task' in kwargs:
+                    kwargs['task'] = Task(**kwargs['task'])
+            except (ValueError, TypeError) as e:
+                self._reply(400, {'error': 'bad request: {0}'.format(e)})
+                return
+            try:
+                result = getattr(queue, method)(**kwargs)
+                body = {'result': [task.to_dict() for task in result] if method == 'lease' else result}
+            except LeaseLost as e:
+                body = {'lease_lost': str(e)}
+            except TypeError as e:
+                self._reply(400, {'error': 'bad arguments for {0}: {1}'.format(method, e)})
+                return
+            except Exception as e:
+                # e.g. sqlite3.OperationalError while another writer holds the lock; the caller may retry.
+                logging.getLogger(__name__).exception('%s failed', method)
+                self._reply(500, {'error': '{0}: {1}'.format(type(e).__name__, e)})
+                return
+            self._reply(200, body)
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logging.getLogger(__name__).debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+class TaskCheckpoint:
+    """
+    Lets gather_data_for_place and finish_restaurants run a batch of leased tasks the way they run with a
+    CrawlCheckpoint: skipping the stages already done and reporting each finished one to the queue.
+    A task whose lease was lost is only counted; whoever holds it now will redo its stages.
+    Used as a context manager, it also heartbeats every task still in flight each `heartbeat` seconds,
+    so a batch held through a long menu scrape or calorie pass keeps its leases.
+    """
+    def __init__(self, queue, tasks, logger=None, heartbeat=None):
+        self.queue = queue
+        self.tasks = dict(((task.location, task.place_id), task) for task in tasks)
+        self.logger = logger
+        self.heartbeat_interval = heartbeat
+        self.resumed = 0
+        self.lost = 0
+        self._released = set()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def __enter__(self):
+        if self.heartbeat_interval:
+            self._heartbeat = threading.Thread(target=self._run_heartbeat, name='lease-heartbeat', daemon=True)
+            self._heartbeat.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+
+    def _run_heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self.heartbeat()
+
+    def heartbeat(self):
+        """
+        Extends the lease of every task that is neither finished nor handed back.
+        """
+        for task in list(self.tasks.values()):
+            if not task.stages or task.id in self._released:
+                continue
+            try:
+                self.queue.heartbeat(task)
+            except LeaseLost:
+                # A fail() or the last stage may have released it in the meantime.
+                if task.stages and task.id not in self._released:
+                    self._released.add(task.id)
+                    self.lost += 1
+                    self._log('Lost the lease on {0}.'.format(task.place_id))
+            except Exception as e:
+                self._log('Heartbeat for {0} failed: {1}'.format(task.place_id, e))
+
+    def _log(self, msg):
+        if self.logger is not None:
+            self.logger.log(msg=msg, level=logging.WARNING)
+
+    def stages(self, location, place_id):
+        task = self.tasks[location, place_id]
+        return set(STAGES) - set(task.stages), task.state
+
+    def resume(self, location, restaurant):
+        restaurant.stages, state = self.stages(location, restaurant.place_id)
+        if state is not None:
+            restore_restaurant(restaurant, state)
+            self.resumed += 1
+        return restaurant.stages
+
+    def fail(self, task, error):
+        """
+        Hands a task back to the queue for a retry, unless its lease is already gone.
+        """
+        self._released.add(task.id)
+        try:
+            self.queue.fail(task, error)
+        except LeaseLost:
+            self.lost += 1
+
+    def stage_done(self, location, restaurant, stage):
+        restaurant.stages.add(stage)
+        if stage == 'stored':
+            # Also how a restaurant with an unchanged menu ends, skipping the stages before it.
+            restaurant.stages.update(STAGES)
+        remaining = [s for s in STAGES if s not in restaurant.stages]
+        try:
+            self.queue.update(self.tasks[location, restaurant.place_id], remaining,
+                              restaurant_state(restaurant) if remaining else None)
+        except LeaseLost:
+            self._released.add(self.tasks[location, restaurant.place_id].id)
+            self.lost += 1
+            self._log('Lost the lease on {0}.'.format(restaurant.place_id))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Work queue shared by crawl workers.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='share a queue database over HTTP')
+    serve_parser.add_argument('--path', default='work_queue.sqlite')
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help='interface to listen on; anyone who can reach it can change the queue')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--visibility-timeout', type=float, default=600)
+    stats_parser = commands.add_parser('stats', help='print task counts by status')
+    stats_parser.add_argument('queue', help='queue database path or server url')
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = serve(WorkQueue(args.path, visibility_timeout=args.visibility_timeout), args.host, args.port)
+        print('Serving {0} on {1}:{2}'.format(args.path, args.host, args.port))
+        server.serve_forever()
+    else:
+        print(open_work_queue(args.queue).stats())